@@ -3,16 +3,20 @@ from tkinter import messagebox
 from tkinter import ttk, filedialog
 import shutil
 import json
+import queue
+import threading
 import webbrowser
 from pathlib import Path
 
-from PIL import Image, ImageTk
-
+# PIL (e pandas/reportlab, via cli) só são importados quando usados: a tela de login abre
+# sem esperar por eles
 from blockchain_ong_sim.cli import (
-    ensure_dirs, emit_extract, canonicalize, build_ledger_from_extract,
-    reconcile, produce_block, render_dashboards, generate_report_html,
-    generate_report_pdf, INBOX, PROCESSED, CONCIL, CHAIN, OUT
+    run_pipeline, report_model_file, INBOX, PROCESSED, CONCIL, CHAIN, OUT
 )
+from blockchain_ong_sim.anchorindex import AnchorIndex
+from blockchain_ong_sim.chainstore import ChainStore
+from blockchain_ong_sim.report_model import report_model
+from blockchain_ong_sim.pipeline import PipelineCancelled
 
 APP_TITLE = "ONG Transparency – Local"
 USERS_FILE = Path.cwd() / 'users.json'
@@ -20,19 +24,20 @@ DARK_BG = '#1f2127'
 DARK_CARD = '#2a2d34'
 DARK_FG = '#E6E6E6'
 ACCENT = '#3B82F6'
+EXPLORER_PAGE = 100
+
+
+STAGE_LABELS = {
+    'extract': 'Extrato', 'canonical': 'Canonicalização', 'ledger': 'Ledger',
+    'conciliation': 'Conciliação', 'block': 'Bloco', 'dashboards': 'Dashboards',
+    'reports': 'Relatórios HTML/PDF',
+}
 
 
-def run_pipeline_once():
-    ensure_dirs()
-    src = emit_extract()
-    canon = canonicalize(src)
-    ledger = build_ledger_from_extract(canon)
-    conc = reconcile(canon, ledger)
-    chain_file = produce_block()
-    render_dashboards(canon, conc)
-    html = generate_report_html(canon, conc, chain_file)
-    pdf = generate_report_pdf(canon, conc, chain_file)
-    return html, pdf
+def run_pipeline_once(progress=None, cancel=None):
+    # Mesmo DAG do run-all (com cache de estágios)
+    results, _skipped = run_pipeline(progress=progress, cancel=cancel)
+    return results['reports']
 
 
 class App(tk.Tk):
@@ -45,6 +50,17 @@ class App(tk.Tk):
         self.configure(bg=DARK_BG)
         self._in_main = False
         self._images_cache = {}
+        # Chave (mtime, largura) da imagem exibida em cada aba e assinatura dos dados carregados
+        self._images_key = {}
+        self._src_images = {}
+        self._data_sig = {}
+        self._resize_job = None
+        self._last_width = None
+        # Pipeline em thread de fundo: eventos numa fila lida pelo loop do Tk via after()
+        self._worker = None
+        self._poll_job = None
+        self._events = queue.Queue()
+        self._cancel = threading.Event()
 
         # ttk dark theme
         style = ttk.Style(self)
@@ -113,8 +129,16 @@ class App(tk.Tk):
         tk.Label(top, text="Sistema Local de Transparência", font=("Segoe UI", 13, "bold"), fg=DARK_FG, bg=DARK_CARD).pack(side="left")
         ttk.Button(top, text="Logout", command=self._logout).pack(side="right", padx=(8,0))
         ttk.Button(top, text="Exportar arquivos", command=self._export_files).pack(side="right", padx=(8,0))
-        ttk.Button(top, text="Executar pipeline", command=self._run_all).pack(side="right", padx=(8,0))
-        ttk.Button(top, text="Atualizar visualização", command=self._refresh_views).pack(side="right")
+        self._cancel_btn = ttk.Button(top, text="Cancelar", command=self._cancel_run, state='disabled')
+        self._cancel_btn.pack(side="right", padx=(8,0))
+        self._run_btn = ttk.Button(top, text="Executar pipeline", command=self._run_all)
+        self._run_btn.pack(side="right", padx=(8,0))
+        self._refresh_btn = ttk.Button(top, text="Atualizar visualização", command=self._refresh_views)
+        self._refresh_btn.pack(side="right")
+        self._progress = ttk.Progressbar(top, length=160, mode='determinate')
+        self._progress.pack(side="right", padx=(8,8))
+        self._status_lbl = tk.Label(top, text="", fg=DARK_FG, bg=DARK_CARD)
+        self._status_lbl.pack(side="right")
 
         # Tabs
         nb = ttk.Notebook(self)
@@ -142,12 +166,7 @@ class App(tk.Tk):
         rep_top.pack(fill="x")
         self._sum_lbl = tk.Label(rep_top, text="Resumo: —", fg=DARK_FG, bg=DARK_BG)
         self._sum_lbl.pack(anchor="w")
-        cols = ("altura","timestamp","txs","merkle_root","block_hash")
-        self._tree = ttk.Treeview(self.tab_rep, columns=cols, show="headings")
-        for c in cols:
-            self._tree.heading(c, text=c)
-            self._tree.column(c, width=120 if c!="merkle_root" and c!="block_hash" else 220, stretch=True)
-        self._tree.pack(expand=True, fill="both", pady=(6,0))
+        self._build_explorer(self.tab_rep)
 
         # Admin tab (user management)
         if self.current_role == 'admin':
@@ -164,72 +183,321 @@ class App(tk.Tk):
         except Exception:
             self.attributes('-zoomed', True)
 
+        # Execução iniciada antes de um logout (ainda terminando, ou terminada com o resultado
+        # na fila): o status volta a ser acompanhado e os controles ficam bloqueados até o fim
+        if self._running() or not self._events.empty():
+            self._run_btn.configure(state='disabled')
+            self._set_explorer_state('disabled')
+            self._status_lbl.config(text="Cancelando execução anterior…" if self._cancel.is_set() else "Executando…")
+            self._poll_job = self.after(100, self._poll_pipeline)
+
         # Initial load
         self._refresh_views()
         # Reajusta imagens quando a janela muda de tamanho
         self.bind("<Configure>", self._on_configure)
 
     def _run_all(self):
+        # Uma execução por vez; o loop do Tk segue livre enquanto a thread trabalha
+        if self._running():
+            messagebox.showinfo("Pipeline", "Uma execução ainda está em curso; aguarde o término.")
+            return
+        self._cancel.clear()
+        self._events = queue.Queue()
+        self._run_btn.configure(state='disabled')
+        self._cancel_btn.configure(state='normal')
+        self._set_explorer_state('disabled')
+        self._progress.configure(value=0, maximum=len(STAGE_LABELS))
+        self._status_lbl.config(text="Iniciando…")
+        self._worker = threading.Thread(target=self._pipeline_worker, args=(self._events, self._cancel), daemon=True)
+        self._worker.start()
+        self._poll_job = self.after(100, self._poll_pipeline)
+
+    def _pipeline_worker(self, events, cancel):
+        # Roda fora da thread do Tk: nunca toca em widgets, só publica eventos
+        def progress(kind, stage, i, total):
+            events.put(('progress', kind, stage, i, total))
+        try:
+            events.put(('done', run_pipeline_once(progress=progress, cancel=cancel)))
+        except PipelineCancelled:
+            events.put(('cancelled',))
+        except Exception as e:
+            events.put(('error', e))
+
+    def _poll_pipeline(self):
         try:
-            html, pdf = run_pipeline_once()
+            while True:
+                ev = self._events.get_nowait()
+                if ev[0] == 'progress':
+                    _, kind, stage, i, total = ev
+                    label = STAGE_LABELS.get(stage, stage)
+                    self._progress.configure(value=i, maximum=total)
+                    self._status_lbl.config(text=f"{label}…" if kind == 'start' else f"{label} ({i}/{total})")
+                else:
+                    self._finish_run(ev)
+                    return
+        except queue.Empty:
+            pass
+        except tk.TclError:
+            # Janela/widgets destruídos (logout) com a thread ainda em curso
+            return
+        self._poll_job = self.after(100, self._poll_pipeline)
+
+    def _running(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def _set_explorer_state(self, state):
+        # Durante uma execução a thread grava cadeia e índices; as leituras do explorador
+        # (ChainStore.sync, AnchorIndex.sync) também gravam, então ficam bloqueadas até o fim
+        for w in self._run_locked:
+            w.configure(state=state)
+
+    def _finish_run(self, ev):
+        # O evento final é o último passo da thread: espera ela sair antes de reabrir as leituras
+        self._worker.join()
+        self._run_btn.configure(state='normal')
+        self._cancel_btn.configure(state='disabled')
+        self._set_explorer_state('normal')
+        if ev[0] == 'done':
+            self._status_lbl.config(text="Concluído")
             messagebox.showinfo("Concluído", "Pipeline concluído e visualizações atualizadas dentro do sistema.")
             self._refresh_views()
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao executar pipeline: {e}")
+        elif ev[0] == 'cancelled':
+            self._status_lbl.config(text="Cancelado")
+            messagebox.showinfo("Cancelado", "Pipeline interrompido; os estágios já concluídos ficam no cache.")
+            self._refresh_views()
+        else:
+            self._status_lbl.config(text="Falhou")
+            messagebox.showerror("Erro", f"Falha ao executar pipeline: {ev[1]}")
+
+    def _cancel_run(self):
+        # Cooperativo: o estágio em curso termina e o próximo não começa
+        if self._worker is not None and self._worker.is_alive():
+            self._cancel.set()
+            self._cancel_btn.configure(state='disabled')
+            self._status_lbl.config(text="Cancelando…")
 
     def _on_configure(self, event=None):
         # Avoid callbacks after logout
         if not self._in_main:
             return
-        self._refresh_views()
+        # <Configure> chega de cada widget filho e dezenas de vezes por arrasto: só a janela
+        # principal conta, só mudança de largura importa, e o redesenho espera o arrasto parar
+        if event is not None and event.widget is not self:
+            return
+        if event is not None and event.width == self._last_width:
+            return
+        self._last_width = event.width if event is not None else None
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+        self._resize_job = self.after(150, self._on_resize_idle)
+
+    def _on_resize_idle(self):
+        self._resize_job = None
+        if self._in_main:
+            self._refresh_images()
 
     def _refresh_views(self):
-        if not self._in_main:
+        if not self._in_main or self._running():
             return
+        self._refresh_images()
+        self._refresh_data()
+
+    def _scaled_photo(self, key: str, png: Path, target_w: int):
+        # Cache por (mtime, largura): voltar a uma largura já vista não redimensiona de novo;
+        # a imagem de origem só é relida do disco quando o arquivo muda. None = nada mudou.
+        st = png.stat()
+        cache_key = (key, st.st_mtime_ns, st.st_size, target_w)
+        if self._images_key.get(key) == cache_key:
+            return None
+        photo = self._images_cache.pop(cache_key, None)
+        if photo is None:
+            from PIL import Image, ImageTk
+            src_sig, src = self._src_images.get(key, (None, None))
+            if src_sig != cache_key[1:3]:
+                with Image.open(png) as img:
+                    src = img.copy()
+                self._src_images[key] = (cache_key[1:3], src)
+            img = src.resize((int(target_w), int(src.height * target_w / src.width)), Image.LANCZOS)
+            photo = ImageTk.PhotoImage(img)
+        self._images_cache[cache_key] = photo
+        while len(self._images_cache) > 8:
+            self._images_cache.pop(next(iter(self._images_cache)))
+        self._images_key[key] = cache_key
+        return photo
+
+    def _refresh_images(self):
         # Load and show images if exist
         try:
-            extrato_png = OUT / 'extrato_dashboard.png'
-            if extrato_png.exists() and hasattr(self, '_img_extrato_lbl') and self._img_extrato_lbl.winfo_exists():
-                img = Image.open(extrato_png)
-                target_w = max(1200, min(1800, (self.winfo_width() or 1200) - 60))
-                img = img.resize((int(target_w), int(img.height * target_w / img.width)), Image.LANCZOS)
-                self._images_cache['extrato'] = ImageTk.PhotoImage(img)
-                self._img_extrato_lbl.configure(image=self._images_cache['extrato'])
-            conc_png = OUT / 'conciliacao_dashboard.png'
-            if conc_png.exists() and hasattr(self, '_img_conc_lbl') and self._img_conc_lbl.winfo_exists():
-                img2 = Image.open(conc_png)
-                target_w = max(1200, min(1800, (self.winfo_width() or 1200) - 60))
-                img2 = img2.resize((int(target_w), int(img2.height * target_w / img2.width)), Image.LANCZOS)
-                self._images_cache['conc'] = ImageTk.PhotoImage(img2)
-                self._img_conc_lbl.configure(image=self._images_cache['conc'])
+            target_w = max(1200, min(1800, (self.winfo_width() or 1200) - 60))
+            for key, png, lbl_name in (('extrato', OUT / 'extrato_dashboard.png', '_img_extrato_lbl'),
+                                       ('conc', OUT / 'conciliacao_dashboard.png', '_img_conc_lbl')):
+                lbl = getattr(self, lbl_name, None)
+                if png.exists() and lbl is not None and lbl.winfo_exists():
+                    photo = self._scaled_photo(key, png, target_w)
+                    if photo is not None:
+                        lbl.configure(image=photo)
         except Exception as e:
             messagebox.showwarning("Visualização", f"Falha ao carregar imagens: {e}")
 
-        # Summary and blocks
+    def _source_sig(self, path: Path | None):
+        if path is None or not path.exists():
+            return None
+        st = path.stat()
+        return (str(path), st.st_mtime_ns, st.st_size)
+
+    def _refresh_data(self):
+        # Summary and blocks: recarrega só o que mudou desde a última leitura
         try:
             # Load latest conciliation
             concs = sorted(CONCIL.glob('*.conciliation.csv'))
-            if concs:
-                import pandas as pd
-                dfc = pd.read_csv(concs[-1])
-                matched = (dfc['status']=='matched').sum(); manual = (dfc['status']=='manual_review').sum(); unmatched = (dfc['status']=='unmatched').sum(); total = len(dfc)
-                pct = (matched/total*100) if total else 0
+            sig = self._source_sig(concs[-1] if concs else None)
+            if sig is not None and sig != self._data_sig.get('conc'):
+                # Contagens do modelo do relatório (mantido por reconcile), sem ler o CSV
+                c = report_model(report_model_file(), concs[-1], None, persist=False)['conciliation']
+                matched, manual, unmatched = c['counts']['matched'], c['counts']['manual_review'], c['counts']['unmatched']
+                total, pct = c['total'], c['match_rate']
                 self._sum_lbl.config(text=f"Resumo: {matched}/{total} matched ({pct:.1f}%), {manual} revisão, {unmatched} sem correspondência.")
+                self._data_sig['conc'] = sig
             # Blocks
-            for i in self._tree.get_children():
-                self._tree.delete(i)
-            chain_file = CHAIN / 'chain.jsonl'
-            if chain_file.exists():
-                import json
-                blocks=[]
-                with chain_file.open('r', encoding='utf-8') as f:
-                    for line in f:
-                        blocks.append(json.loads(line))
-                for b in blocks[-15:]:
-                    self._tree.insert('', 'end', values=(b.get('height'), b.get('timestamp'), b.get('tx_count'), b.get('merkle_root'), b.get('block_hash')))
+            sig = self._source_sig(CHAIN / 'chain.jsonl')
+            if sig != self._data_sig.get('chain'):
+                # Quem estava na última página acompanha a ponta; senão mantém a página aberta
+                at_tail = self._page_start is None or self._page_start + EXPLORER_PAGE >= self._explorer_total
+                self._data_sig['chain'] = sig
+                self._show_page(None if at_tail else self._page_start)
         except Exception as e:
             messagebox.showwarning("Relatório", f"Falha ao carregar relatório: {e}")
 
+    # Explorador da cadeia: só uma página de blocos na árvore por vez, lida do chain.jsonl
+    # por offset (chain.idx); as txs de um bloco só são lidas quando ele é expandido.
+    def _build_explorer(self, parent):
+        self._page_start = None
+        self._explorer_total = 0
+        nav = tk.Frame(parent, bg=DARK_BG)
+        nav.pack(fill="x", pady=(6,0))
+        self._run_locked = [self._refresh_btn]
+        for i, (text, cmd) in enumerate((("«", lambda: self._show_page(0)),
+                                         ("‹", lambda: self._show_page(max(0, (self._page_start or 0) - EXPLORER_PAGE))),
+                                         ("›", lambda: self._show_page((self._page_start or 0) + EXPLORER_PAGE)),
+                                         ("»", lambda: self._show_page(None)))):
+            btn = ttk.Button(nav, text=text, width=3, command=cmd)
+            btn.pack(side="left", padx=(4,0) if i else 0)
+            self._run_locked.append(btn)
+        self._page_lbl = tk.Label(nav, text="", fg=DARK_FG, bg=DARK_BG)
+        self._page_lbl.pack(side="left", padx=12)
+        self._search_e = tk.Entry(nav, width=40, bg=DARK_CARD, fg=DARK_FG, insertbackground=DARK_FG, relief='flat')
+        self._search_e.pack(side="right")
+        self._search_e.bind("<Return>", lambda e: self._search_hash())
+        search_btn = ttk.Button(nav, text="Buscar hash", command=self._search_hash)
+        search_btn.pack(side="right", padx=(0,4))
+        self._height_e = tk.Entry(nav, width=10, bg=DARK_CARD, fg=DARK_FG, insertbackground=DARK_FG, relief='flat')
+        self._height_e.pack(side="right", padx=(0,12))
+        self._height_e.bind("<Return>", lambda e: self._jump_height())
+        height_btn = ttk.Button(nav, text="Ir para altura", command=self._jump_height)
+        height_btn.pack(side="right", padx=(0,4))
+        self._run_locked += [self._search_e, search_btn, self._height_e, height_btn]
+
+        cols = ("timestamp","txs","merkle_root","block_hash")
+        body = tk.Frame(parent, bg=DARK_BG)
+        body.pack(expand=True, fill="both", pady=(6,0))
+        self._tree = ttk.Treeview(body, columns=cols, show="tree headings")
+        self._tree.heading('#0', text="altura / tx")
+        self._tree.column('#0', width=140, stretch=False)
+        for c in cols:
+            self._tree.heading(c, text=c)
+            self._tree.column(c, width=120 if c!="merkle_root" and c!="block_hash" else 220, stretch=True)
+        sb = ttk.Scrollbar(body, orient="vertical", command=self._tree.yview)
+        self._tree.configure(yscrollcommand=sb.set)
+        sb.pack(side="right", fill="y")
+        self._tree.pack(side="left", expand=True, fill="both")
+        self._tree.bind("<<TreeviewOpen>>", self._on_block_open)
+
+    def _chain_store(self):
+        chain_file = CHAIN / 'chain.jsonl'
+        return ChainStore(chain_file) if chain_file.exists() else None
+
+    def _show_page(self, start):
+        # start=None: última página (ponta da cadeia)
+        if self._running():
+            return
+        store = self._chain_store()
+        self._explorer_total = len(store) if store is not None else 0
+        total = self._explorer_total
+        if start is None:
+            start = max(0, (total - 1) // EXPLORER_PAGE * EXPLORER_PAGE)
+        start = max(0, min(start, max(0, total - 1)))
+        start -= start % EXPLORER_PAGE
+        self._page_start = start
+        self._tree.delete(*self._tree.get_children())
+        stop = min(start + EXPLORER_PAGE, total)
+        for b in (store.range(start, stop) if store is not None else []):
+            iid = f"b{b['height']}"
+            self._tree.insert('', 'end', iid=iid, text=str(b.get('height')),
+                              values=(b.get('timestamp'), b.get('tx_count'), b.get('merkle_root'), b.get('block_hash')))
+            if b.get('tx_count'):
+                # Filho provisório: deixa o bloco expansível sem carregar as txs
+                self._tree.insert(iid, 'end', iid=f"{iid}:pending", text="…")
+        self._page_lbl.config(text=f"Blocos {start}–{max(start, stop - 1)} de {total}" if total else "Sem blocos")
+        if self._tree.get_children():
+            self._tree.see(self._tree.get_children()[-1])
+
+    def _on_block_open(self, event=None):
+        iid = self._tree.focus()
+        self._expand_block(iid)
+
+    def _expand_block(self, iid):
+        if not iid.startswith('b') or not self._tree.exists(f"{iid}:pending") or self._running():
+            return
+        self._tree.delete(f"{iid}:pending")
+        store = self._chain_store()
+        if store is None:
+            return
+        b = store.get(int(iid[1:]))
+        for i, tx in enumerate(b.get('txs') or []):
+            self._tree.insert(iid, 'end', iid=f"{iid}:{i}", text=f"tx {i}",
+                              values=(tx.get('timestamp'), tx.get('kind'), tx.get('sha256'), tx.get('source_file')))
+
+    def _reveal(self, height, tx_index=None):
+        self._show_page(height)
+        iid = f"b{height}"
+        if not self._tree.exists(iid):
+            return
+        if tx_index is not None:
+            self._expand_block(iid)
+            self._tree.item(iid, open=True)
+            iid = f"{iid}:{tx_index}"
+        self._tree.selection_set(iid)
+        self._tree.focus(iid)
+        self._tree.see(iid)
+
+    def _jump_height(self):
+        try:
+            h = int(self._height_e.get().strip())
+        except ValueError:
+            messagebox.showwarning("Explorador", "Informe uma altura numérica.")
+            return
+        if not 0 <= h < self._explorer_total:
+            messagebox.showwarning("Explorador", f"Altura fora da cadeia (0–{self._explorer_total - 1}).")
+            return
+        self._reveal(h)
+
+    def _search_hash(self):
+        # block_hash pelo índice de hashes; senão sha256/arquivo ancorado pelo índice de âncoras
+        q = self._search_e.get().strip()
+        store = self._chain_store()
+        if not q or store is None or self._running():
+            return
+        b = store.get_by_hash(q)
+        if b is not None:
+            self._reveal(b['height'])
+            return
+        hits = AnchorIndex(CHAIN / 'chain.jsonl').lookup(q)
+        if hits:
+            _field, h, i = max(hits, key=lambda r: r[1])
+            self._reveal(h, i)
+            return
+        messagebox.showinfo("Explorador", "Hash não encontrado na cadeia.")
+
     def _export_files(self):
         # Seleciona pasta e copia artefatos principais
         dest_base = filedialog.askdirectory(title="Selecione a pasta de destino para exportação")
@@ -283,11 +551,24 @@ class App(tk.Tk):
             self.unbind("<Configure>")
         except Exception:
             pass
+        # Pipeline em curso é interrompido no próximo estágio; o acompanhamento recomeça no
+        # próximo login (eventos ficam na fila)
+        self._cancel.set()
+        if self._poll_job is not None:
+            self.after_cancel(self._poll_job)
+            self._poll_job = None
         self._in_main = False
         self.current_user = None
         self.current_role = None
         # Clear cached images
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+            self._resize_job = None
         self._images_cache.clear()
+        self._images_key.clear()
+        self._src_images.clear()
+        self._data_sig.clear()
+        self._last_width = None
         self._build_login()
 
     def _center_window(self, w: int, h: int):
@@ -374,4 +655,8 @@ class App(tk.Tk):
 
 
 if __name__ == "__main__":
+    # Executável congelado (PyInstaller): os workers de processo (dashboards, pipeline) não
+    # devem abrir outra GUI
+    import multiprocessing
+    multiprocessing.freeze_support()
     App().mainloop()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+from pathlib import Path
+
+from .chainstore import NO_HASH, ChainStore, hash_bytes
+from .hashtable import DiskHashTable
+
+# Índice de âncoras ao lado da cadeia, sempre reconstruível a partir de chain.jsonl:
+#  - chain.anchorlog: registros de largura fixa (chave, altura, índice da tx, registro
+#    anterior da mesma chave), só acrescentados; um write por bloco.
+#  - chain.anchortab: tabela hash (ver hashtable.py) 'campo:valor' -> último registro da
+#    chave; marca = blocos indexados, extra = block_hash do último deles. Abrir e consultar
+#    não dependem do tamanho do histórico (sem dbm).
+#  - chain.bloom: um filtro de Bloom por bloco, dimensionado pelo número de chaves do
+#    bloco para a taxa de falsos positivos BLOOM_FP (um filtro fixo satura em blocos
+#    grandes e passa a responder "talvez" para tudo), para responder "não está neste bloco"
+#    sem ler o bloco. chain.bloomidx guarda, na altura h (h * BLOOM_REC.size), offset,
+#    tamanho e k do filtro.
+ANCHOR_KEYS = ('sha256', 'source_file', 'canonical_file')
+BLOOM_FP = 0.01
+BLOOM_REC = struct.Struct('<QIB')   # offset em chain.bloom, bytes, k
+POST = struct.Struct('<16sQIQ')   # chave, altura, índice da tx, registro anterior + 1 (0 = nenhum)
+
+
+def _key(field: str, value) -> str:
+    return f'{field}:{value}'
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.sha256(key.encode('utf-8')).digest()
+
+
+def bloom_params(n: int, fp: float = BLOOM_FP) -> tuple[int, int]:
+    # (bytes, k) ótimos para n chaves: m = -n ln p / ln² 2 bits, k = m/n ln 2
+    if not n:
+        return 8, 1
+    m = math.ceil(-n * math.log(fp) / math.log(2) ** 2)
+    nbytes = (m + 63) // 64 * 8
+    return nbytes, max(1, min(255, round(nbytes * 8 / n * math.log(2))))
+
+
+def _bits(key: str, m: int, k: int, d: bytes | None = None) -> list[int]:
+    # Hash duplo (h1 + i·h2) nos 16 primeiros bytes do digest; a tabela usa os 16 últimos
+    d = d or _digest(key)
+    h1 = int.from_bytes(d[:8], 'little')
+    h2 = int.from_bytes(d[8:16], 'little') | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+def bloom_of(keys: list[str], digests: list[bytes] | None = None) -> tuple[bytes, int]:
+    # (filtro, k) dimensionado para len(keys)
+    nbytes, k = bloom_params(len(keys))
+    bloom = bytearray(nbytes)
+    for key, d in zip(keys, digests or [None] * len(keys)):
+        for b in _bits(key, nbytes * 8, k, d):
+            bloom[b >> 3] |= 1 << (b & 7)
+    return bytes(bloom), k
+
+
+def bloom_has(bloom: bytes, k: int, key: str) -> bool:
+    return all(bloom[b >> 3] & (1 << (b & 7)) for b in _bits(key, len(bloom) * 8, k))
+
+
+def block_keys(block: dict) -> list[tuple[str, int]]:
+    out = []
+    for i, tx in enumerate(block.get('txs') or []):
+        for f in ANCHOR_KEYS:
+            if tx.get(f) is not None:
+                out.append((_key(f, tx[f]), i))
+    return out
+
+
+class AnchorIndex:
+
+    def __init__(self, chain_file: Path):
+        self.store = ChainStore(chain_file)
+        self.log_path = self.store.path.with_suffix('.anchorlog')
+        self.tab_path = self.store.path.with_suffix('.anchortab')
+        self.bloom_path = self.store.path.with_suffix('.bloom')
+        self.bloomidx_path = self.store.path.with_suffix('.bloomidx')
+
+    def _table(self) -> DiskHashTable:
+        try:
+            return DiskHashTable(self.tab_path)
+        except ValueError:
+            self.tab_path.unlink()
+            return DiskHashTable(self.tab_path)
+
+    def add_block(self, block: dict, tab: DiskHashTable | None = None) -> None:
+        # Chamado por produce_block logo após o append; ignora blocos já indexados. Bloco
+        # ilegível chega como {'height': h} (sem txs) e só avança a marca
+        if tab is None:
+            with self._table() as tab:
+                return self.add_block(block, tab)
+        h = block['height']
+        if h != tab.mark:
+            return
+        keys = block_keys(block)
+        digests = [_digest(k) for k, _ in keys]
+        with self.log_path.open('ab') as log:
+            # Registro parcial de uma queda anterior é descartado
+            n = log.tell() // POST.size
+            log.truncate(n * POST.size)
+            last, buf = {}, bytearray()
+            for (_k, i), d in zip(keys, digests):
+                key = d[16:]
+                prev = last[key] if key in last else tab.get(key)
+                buf += POST.pack(key, h, i, prev + 1 if prev is not None else 0)
+                last[key] = n
+                n += 1
+            log.write(buf)
+        tab.reserve(len(last))
+        for key, rec in last.items():
+            tab.put(key, rec)
+        bloom, k = bloom_of([k for k, _ in keys], digests)
+        end = 0
+        with self.bloomidx_path.open('r+b' if self.bloomidx_path.exists() else 'wb') as idx:
+            if h:
+                idx.seek((h - 1) * BLOOM_REC.size)
+                off, size, _k = BLOOM_REC.unpack(idx.read(BLOOM_REC.size))
+                end = off + size
+            with self.bloom_path.open('r+b' if self.bloom_path.exists() else 'wb') as f:
+                f.truncate(end)
+                f.seek(end)
+                f.write(bloom)
+            idx.truncate(h * BLOOM_REC.size)
+            idx.seek(h * BLOOM_REC.size)
+            idx.write(BLOOM_REC.pack(end, len(bloom), k))
+        tab.set_mark(h + 1, hash_bytes(block.get('block_hash')))
+
+    def rebuild(self, page: int = 256) -> int:
+        # Também remove o chain.anchors (dbm) de versões anteriores
+        for p in (self.tab_path, self.log_path, self.bloom_path, self.bloomidx_path,
+                  *self.store.path.parent.glob(self.store.path.stem + '.anchors*')):
+            p.unlink(missing_ok=True)
+        return self.sync(page)
+
+    def sync(self, page: int = 256) -> int:
+        # Indexa só os blocos novos; se a cadeia divergiu do índice, reconstrói
+        if not self.store.path.exists():
+            return 0
+        total = len(self.store)
+        with self._table() as tab:
+            n = tab.mark
+            stale = (n > total or (n and (self.store.block_hash(n - 1) or NO_HASH.hex()) != tab.extra.hex())
+                     or (self.bloomidx_path.stat().st_size if self.bloomidx_path.exists() else 0) < n * BLOOM_REC.size
+                     or (not n and self.log_path.exists() and self.log_path.stat().st_size)
+                     or (not n and any(self.store.path.parent.glob(self.store.path.stem + '.anchors*'))))
+            if not stale:
+                for start in range(n, total, page):
+                    for h, b in self.store.blocks(start, min(start + page, total)):
+                        self.add_block({**(b or {}), 'height': h}, tab)
+        if stale:
+            return self.rebuild(page)
+        return total
+
+    def _postings(self, tab: DiskHashTable, log, field: str, value) -> list[tuple[str, int, int]]:
+        rec = tab.get(_digest(_key(field, value))[16:])
+        out = []
+        while rec is not None:
+            log.seek(rec * POST.size)
+            _key16, h, i, prev = POST.unpack(log.read(POST.size))
+            out.append((field, h, i))
+            rec = prev - 1 if prev else None
+        # Encadeados do mais novo para o mais antigo; uma queda no meio de add_block pode
+        # ter gravado o mesmo bloco duas vezes
+        return sorted(set(out), key=lambda r: (r[1], r[2]))
+
+    def lookup(self, value: str, fields: tuple[str, ...] = ANCHOR_KEYS) -> list[tuple[str, int, int]]:
+        # (campo, altura, índice da tx) de cada ocorrência; uma sondagem na tabela por campo
+        return self.lookup_many([value], fields)[value]
+
+    def lookup_many(self, values, fields: tuple[str, ...] = ANCHOR_KEYS) -> dict[str, list[tuple[str, int, int]]]:
+        # lookup() em lote: um sync e uma abertura da tabela/log para todos os valores
+        self.sync()
+        out = {v: [] for v in values}
+        if not self.log_path.exists():
+            return out
+        with self._table() as tab, self.log_path.open('rb') as log:
+            for v in out:
+                for f in fields:
+                    out[v].extend(self._postings(tab, log, f, v))
+        return out
+
+    def may_contain(self, height: int, field: str, value) -> bool:
+        # Falso = certamente não está no bloco (sem ler chain.jsonl)
+        if not self.bloomidx_path.exists():
+            return True
+        with self.bloomidx_path.open('rb') as idx:
+            idx.seek(height * BLOOM_REC.size)
+            rec = idx.read(BLOOM_REC.size)
+        if len(rec) < BLOOM_REC.size:
+            return True
+        off, size, k = BLOOM_REC.unpack(rec)
+        with self.bloom_path.open('rb') as f:
+            f.seek(off)
+            bloom = f.read(size)
+        return len(bloom) < size or bloom_has(bloom, k, _key(field, value))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import heapq
+import itertools
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+SORT_KEYS = ['date', 'amount', 'description']
+NUM_COLS = ('amount', 'balance')
+
+
+def read_extract(src: Path, chunksize: int | None = None):
+    # Tipos fixos em vez de inferidos: inferidos por bloco, uma coluna numérica com vazios
+    # sairia '7.0' num bloco e '7' no outro, e o hash canônico dependeria de --chunk-rows.
+    # Valores como float, todo o resto (texto, ids, data) como str.
+    cols = pd.read_csv(src, nrows=0).columns
+    return pd.read_csv(src, dtype={c: 'float64' if c in NUM_COLS else str for c in cols}, chunksize=chunksize)
+
+
+def normalize_extract(df: pd.DataFrame) -> pd.DataFrame:
+    # Ordenar por data, normalizar campos texto
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601').dt.date.astype(str)
+    for c in ['description','category','counterparty']:
+        df[c] = df[c].astype(str).str.strip()
+    df['amount'] = df['amount'].astype(float).round(2)
+    df['balance'] = df['balance'].astype(float).round(2)
+    return df.sort_values(SORT_KEYS).reset_index(drop=True)
+
+
+class HashingWriter:
+    # Arquivo texto que atualiza o sha256 a cada write (evita reler a saída para o hash)
+
+    def __init__(self, path: Path):
+        self._f = open(path, 'w', newline='', encoding='utf-8')
+        self._h = hashlib.sha256()
+
+    def write(self, s: str) -> int:
+        self._h.update(s.encode('utf-8'))
+        return self._f.write(s)
+
+    def hexdigest(self) -> str:
+        return self._h.hexdigest()
+
+    def close(self) -> None:
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _run_rows(path: Path, key_idx: tuple[int, int, int], run_no: int):
+    # Linhas de um run ordenado com a chave de ordenação do pandas: as três primeiras colunas
+    # do run marcam valores ausentes (que o pandas coloca por último em cada chave)
+    d_i, a_i, s_i = (i + 3 for i in key_idx)
+    with open(path, newline='', encoding='utf-8') as f:
+        for line_no, row in enumerate(csv.reader(f)):
+            key = ((row[0] == '1', row[d_i]),
+                   (row[1] == '1', float(row[a_i]) if row[1] != '1' else 0.0),
+                   (row[2] == '1', row[s_i]), run_no, line_no)
+            yield key, row[3:]
+
+
+def write_canonical(src: Path, out: Path, chunk_rows: int = 200_000) -> tuple[str, int, int]:
+    # Ordenação externa: cada bloco de chunk_rows linhas é normalizado, ordenado e gravado
+    # como run temporário; os runs são intercalados (heap) direto no arquivo final. A saída
+    # é byte a byte igual à de normalize_extract(read_extract(src)).to_csv(out, index=False),
+    # qualquer que seja chunk_rows (ver scripts/check_canonical.py).
+    # Devolve (sha256, número de linhas, número de runs).
+    reader = read_extract(src, chunk_rows)
+    first = next(reader, None)
+    second = next(reader, None) if first is not None else None
+    if second is None:
+        # Cabe num bloco: caminho direto, sem runs temporários
+        df = normalize_extract(first if first is not None else read_extract(src))
+        with HashingWriter(out) as w:
+            df.to_csv(w, index=False)
+            return w.hexdigest(), len(df), 1
+    with tempfile.TemporaryDirectory(dir=out.parent, prefix='.canon-') as tmp:
+        runs, rows = [], 0
+        for chunk in itertools.chain([first, second], reader):
+            chunk = normalize_extract(chunk)
+            rows += len(chunk)
+            cols = list(chunk.columns)
+            run = Path(tmp) / f'run{len(runs):05d}.csv'
+            flags = pd.DataFrame({k: chunk[k].isna().astype(int) for k in SORT_KEYS})
+            pd.concat([flags.set_axis(['_na_date', '_na_amount', '_na_desc'], axis=1), chunk], axis=1) \
+                .to_csv(run, index=False, header=False)
+            runs.append(run)
+        key_idx = tuple(cols.index(k) for k in SORT_KEYS)
+        merged = heapq.merge(*(_run_rows(r, key_idx, i) for i, r in enumerate(runs)), key=lambda kr: kr[0])
+        with HashingWriter(out) as w:
+            cw = csv.writer(w, lineterminator=os.linesep)
+            cw.writerow(cols)
+            for _, row in merged:
+                cw.writerow(row)
+            return w.hexdigest(), rows, len(runs)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+
+from .hashtable import DiskHashTable
+from .merkle import MerkleTree
+
+# Registro do índice: offset (u64) e tamanho (u32) da linha do bloco em chain.jsonl;
+# o registro da altura h fica em h * REC.size, então não há varredura.
+REC = struct.Struct('<QI')
+HEADER_FIELDS = ('height', 'timestamp', 'prev_hash', 'merkle_root', 'tx_count')
+# block_hash binário da altura h em h * HASH_SIZE de chain.hashlog (zeros = bloco ilegível)
+HASH_SIZE = 32
+NO_HASH = bytes(HASH_SIZE)
+
+
+def header_hash(block: dict) -> str:
+    header = {k: block.get(k) for k in HEADER_FIELDS}
+    return hashlib.sha256(json.dumps(header, separators=(',',':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def check_block(raw: bytes) -> tuple[int | None, str | None, str | None, str | None]:
+    # Validação isolada de um bloco (sem a ligação com o anterior):
+    # devolve (altura, block_hash, prev_hash, erro)
+    try:
+        b = json.loads(raw)
+    except ValueError as e:
+        return None, None, None, f'invalid json: {e}'
+    h = b.get('height')
+    txs = b.get('txs') or []
+    if b.get('tx_count') != len(txs):
+        return h, b.get('block_hash'), b.get('prev_hash'), 'tx_count mismatch'
+    leaves = [json.dumps(tx, separators=(',',':'), ensure_ascii=False).encode('utf-8') for tx in txs]
+    if MerkleTree(leaves).root != b.get('merkle_root'):
+        return h, b.get('block_hash'), b.get('prev_hash'), 'merkle_root mismatch'
+    if header_hash(b) != b.get('block_hash'):
+        return h, b.get('block_hash'), b.get('prev_hash'), 'block_hash mismatch'
+    return h, b['block_hash'], b.get('prev_hash'), None
+
+
+def hash_bytes(block_hash) -> bytes:
+    try:
+        raw = bytes.fromhex(block_hash)
+    except (TypeError, ValueError):
+        return NO_HASH
+    return raw if len(raw) == HASH_SIZE else NO_HASH
+
+
+def _parse_line(body: bytes) -> dict | None:
+    # Linha ilegível (JSON corrompido) continua indexada por offset/tamanho; verify-chain a
+    # aponta via check_block
+    try:
+        b = json.loads(body)
+    except ValueError:
+        return None
+    return b if isinstance(b, dict) else None
+
+
+def check_blocks(raws: list[bytes]) -> list[tuple]:
+    return [check_block(r) for r in raws]
+
+
+class ChainStore:
+    # chain.jsonl continua sendo o artefato; ao lado ficam chain.idx (altura -> offset),
+    # chain.tip.json (último bloco), chain.hashlog (altura -> block_hash, largura fixa) e
+    # chain.htab (tabela hash block_hash -> altura, alimentada a partir do hashlog só quando
+    # há consulta por hash). append escreve só no fim de arquivos: custo fixo por bloco.
+
+    def __init__(self, chain_file: Path):
+        self.path = Path(chain_file)
+        self.idx_path = self.path.with_suffix('.idx')
+        self.tip_path = self.path.with_suffix('.tip.json')
+        self.hashlog_path = self.path.with_suffix('.hashlog')
+        self.htab_path = self.path.with_suffix('.htab')
+
+    # -- índice -------------------------------------------------------------
+    def _file_size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def _count(self) -> int:
+        return self.idx_path.stat().st_size // REC.size if self.idx_path.exists() else 0
+
+    def _record(self, height: int) -> tuple[int, int]:
+        with self.idx_path.open('rb') as f:
+            f.seek(height * REC.size)
+            return REC.unpack(f.read(REC.size))
+
+    def _end_of(self, rec: tuple[int, int]) -> int | None:
+        # Fim da linha, incluindo '\n' (ou '\r\n' de cadeias antigas gravadas em modo texto);
+        # None se o registro não aponta para um fim de linha (índice inválido)
+        off, ln = rec
+        with self.path.open('rb') as f:
+            f.seek(off + ln)
+            tail = f.read(2)
+        if tail.startswith(b'\r\n'):
+            return off + ln + 2
+        if tail.startswith(b'\n'):
+            return off + ln + 1
+        return None
+
+    def sync(self) -> None:
+        # Garante que o índice cobre o arquivo; só indexa o trecho novo (ou reconstrói se divergiu)
+        size = self._file_size()
+        n = self._count()
+        start, height = 0, 0
+        if n:
+            end = self._end_of(self._record(n - 1))
+            if end == size:
+                self._sync_hashlog(n)
+                return
+            if end is not None and end < size:
+                start, height = end, n
+        elif not size:
+            return
+        if not start:
+            self._reset()
+        else:
+            self._sync_hashlog(n)
+        with self.path.open('rb') as f, self.idx_path.open('ab') as idx, self.hashlog_path.open('ab') as hl:
+            f.seek(start)
+            off = start
+            last = None
+            for line in f:
+                body = line.rstrip(b'\r\n')
+                if body:
+                    last = _parse_line(body)
+                    idx.write(REC.pack(off, len(body)))
+                    hl.write(hash_bytes(last.get('block_hash')) if last is not None else NO_HASH)
+                    height += 1
+                off += len(line)
+        if last is not None:
+            self._write_tip(last, height - 1)
+
+    def _hashlog_count(self) -> int:
+        return self.hashlog_path.stat().st_size // HASH_SIZE if self.hashlog_path.exists() else 0
+
+    def _sync_hashlog(self, n: int) -> None:
+        # hashlog com exatamente n registros (ex.: queda entre o append do índice e o do hashlog)
+        have = self._hashlog_count()
+        if have == n and self.hashlog_path.stat().st_size == n * HASH_SIZE:
+            return
+        with self.hashlog_path.open('ab') as hl:
+            hl.truncate(min(have, n) * HASH_SIZE)
+            for raw in self.raw_range_unsynced(have, n):
+                b = _parse_line(raw)
+                hl.write(hash_bytes(b.get('block_hash')) if b is not None else NO_HASH)
+
+    def _reset(self) -> None:
+        # Também remove o chain.hashes (dbm) de versões anteriores
+        for p in (self.idx_path, self.tip_path, self.hashlog_path, self.htab_path,
+                  *self.path.parent.glob(self.path.stem + '.hashes*')):
+            if p.exists():
+                p.unlink()
+
+    def _write_tip(self, block: dict, height: int) -> None:
+        tip = {k: v for k, v in block.items() if k != 'txs'}
+        tip['height'] = height
+        tip['_size'] = self._file_size()
+        tmp = self.tip_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(tip, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.tip_path)
+
+    # -- leitura ------------------------------------------------------------
+    def __len__(self) -> int:
+        self.sync()
+        return self._count()
+
+    def tip(self) -> dict | None:
+        # Cabeçalho do último bloco em O(1): cache validado pelo tamanho do arquivo
+        if self.tip_path.exists():
+            tip = json.loads(self.tip_path.read_text(encoding='utf-8'))
+            if tip.get('_size') == self._file_size():
+                tip.pop('_size')
+                return tip
+        self.sync()
+        n = self._count()
+        if not n:
+            return None
+        b = self.get(n - 1)
+        self._write_tip(b, n - 1)
+        return {k: v for k, v in b.items() if k != 'txs'}
+
+    def get(self, height: int) -> dict:
+        self.sync()
+        off, ln = self._record(height)
+        with self.path.open('rb') as f:
+            f.seek(off)
+            return json.loads(f.read(ln))
+
+    def block_hash(self, height: int) -> str | None:
+        # block_hash da altura sem ler o bloco (None = fora da cadeia ou bloco ilegível)
+        self.sync()
+        if not 0 <= height < self._count():
+            return None
+        with self.hashlog_path.open('rb') as f:
+            f.seek(height * HASH_SIZE)
+            raw = f.read(HASH_SIZE)
+        return raw.hex() if raw != NO_HASH else None
+
+    def _htab(self, n: int) -> DiskHashTable:
+        # Tabela hash -> altura em dia com as n primeiras alturas do hashlog
+        try:
+            tab = DiskHashTable(self.htab_path)
+        except ValueError:
+            self.htab_path.unlink()
+            tab = DiskHashTable(self.htab_path)
+        if tab.mark > n:
+            tab.close()
+            self.htab_path.unlink()
+            tab = DiskHashTable(self.htab_path)
+        if tab.mark < n:
+            with self.hashlog_path.open('rb') as f:
+                f.seek(tab.mark * HASH_SIZE)
+                raw = f.read((n - tab.mark) * HASH_SIZE)
+            for i in range(0, len(raw), HASH_SIZE):
+                digest = raw[i:i + HASH_SIZE]
+                if digest != NO_HASH:
+                    tab.put(digest[:16], tab.mark + i // HASH_SIZE)
+            tab.set_mark(n)
+        return tab
+
+    def get_by_hash(self, block_hash: str) -> dict | None:
+        digest = hash_bytes(block_hash)
+        if digest == NO_HASH:
+            return None
+        self.sync()
+        with self._htab(self._count()) as tab:
+            h = tab.get(digest[:16])
+        # A tabela guarda só o prefixo: confirma o hash inteiro no hashlog
+        return self.get(h) if h is not None and self.block_hash(h) == digest.hex() else None
+
+    def raw_range(self, start: int, stop: int) -> list[bytes]:
+        # Linhas dos blocos [start, stop) lidas com um seek e uma leitura contígua
+        self.sync()
+        return self.raw_range_unsynced(start, stop)
+
+    def raw_range_unsynced(self, start: int, stop: int) -> list[bytes]:
+        n = self._count()
+        start, stop = max(0, start), min(stop, n)
+        if start >= stop:
+            return []
+        with self.idx_path.open('rb') as idx:
+            idx.seek(start * REC.size)
+            recs = list(REC.iter_unpack(idx.read((stop - start) * REC.size)))
+        first = recs[0][0]
+        last_off, last_ln = recs[-1]
+        with self.path.open('rb') as f:
+            f.seek(first)
+            raw = f.read(last_off + last_ln - first)
+        return [raw[off - first:off - first + ln] for off, ln in recs]
+
+    def blocks(self, start: int, stop: int) -> list[tuple[int, dict | None]]:
+        # (altura, bloco) de [start, stop); None = linha ilegível (verify-chain aponta o motivo)
+        start = max(0, start)
+        return [(start + i, _parse_line(r)) for i, r in enumerate(self.raw_range(start, stop))]
+
+    def range(self, start: int, stop: int) -> list[dict]:
+        # Só os blocos legíveis: leitores de cabeçalho/txs pulam linhas corrompidas
+        return [b for _h, b in self.blocks(start, stop) if b is not None]
+
+    def last(self, n: int) -> list[dict]:
+        total = len(self)
+        return self.range(total - n, total)
+
+    # -- escrita ------------------------------------------------------------
+    def append(self, block: dict) -> None:
+        self.sync()
+        line = json.dumps(block, ensure_ascii=False).encode('utf-8')
+        off = self._file_size()
+        with self.path.open('ab') as f:
+            f.write(line + b'\n')
+        with self.idx_path.open('ab') as idx:
+            idx.write(REC.pack(off, len(line)))
+        with self.hashlog_path.open('ab') as hl:
+            hl.write(hash_bytes(block['block_hash']))
+        self._write_tip(block, block['height'])
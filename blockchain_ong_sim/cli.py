@@ -1,24 +1,46 @@
 from __future__ import annotations
 import argparse
+import contextlib
 import csv
 import json
+import os
 from pathlib import Path
 from datetime import datetime, date, timedelta
-import hashlib
 import random
 
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
+# Só dependências leves no topo: pandas/NumPy (canonical, matching, lsh), PIL (dashboards)
+# e reportlab são importados dentro dos estágios que os usam, para que comandos como
+# anchor/emit-extract/lookup e a tela de login da GUI não paguem essa importação.
+# Ver scripts/bench_import.py.
+from .anchorindex import ANCHOR_KEYS, AnchorIndex
+from .chainstore import ChainStore, check_blocks, header_hash
+from .columnar import file_sha256, read_table, write_sidecar
+from . import metrics
+from .mempool import AnchorJournal, BlockPolicy, file_lock
+from .merkle import MerkleFrontier, MerkleTree, proof_from_file, verify_batch
+from .pipeline import Stage, StageCache, run_dag
+from .report_model import record_block, record_conciliation, report_model
 
-try:
-    # Optional PDF report generation
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
-    from reportlab.lib import colors
-    REPORTLAB_AVAILABLE = True
-except Exception:
-    REPORTLAB_AVAILABLE = False
+
+def reportlab_available() -> bool:
+    # PDF opcional: reportlab é resolvido no primeiro uso e o resultado fica no módulo
+    if 'REPORTLAB_AVAILABLE' not in globals():
+        try:
+            import reportlab.platypus  # noqa: F401
+            globals()['REPORTLAB_AVAILABLE'] = True
+        except Exception:
+            globals()['REPORTLAB_AVAILABLE'] = False
+    return globals()['REPORTLAB_AVAILABLE']
+
+
+def __getattr__(name):
+    # Nomes públicos que dependem de importações pesadas (cli.REPORTLAB_AVAILABLE, cli.draw_table_image)
+    if name == 'REPORTLAB_AVAILABLE':
+        return reportlab_available()
+    if name == 'draw_table_image':
+        from .dashboards import draw_table_image
+        return draw_table_image
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 # Use the current working directory as the root so packaged executables work as expected
 ROOT = Path.cwd()
@@ -32,6 +54,34 @@ CHAIN = ROOT / 'chain'
 OUT = ROOT / 'out'
 
 
+def set_root(root: Path) -> None:
+    # Troca a conta (ONG) atendida pelo processo: os estágios leem estes globais na chamada
+    global ROOT, DATA, INBOX, PROCESSED, ANCHORS, LEDGER, CONCIL, CHAIN, OUT
+    ROOT = Path(root).resolve()
+    DATA = ROOT / 'data'
+    INBOX = DATA / 'inbox'
+    PROCESSED = DATA / 'processed'
+    ANCHORS = DATA / 'anchors'
+    LEDGER = DATA / 'ledger'
+    CONCIL = DATA / 'conciliation'
+    CHAIN = ROOT / 'chain'
+    OUT = ROOT / 'out'
+
+
+@contextlib.contextmanager
+def using_root(root: Path):
+    prev = ROOT
+    set_root(root)
+    try:
+        yield
+    finally:
+        set_root(prev)
+
+
+def report_model_file() -> Path:
+    return DATA / 'report_model.json'
+
+
 def ensure_dirs():
     for p in [INBOX, PROCESSED, ANCHORS, LEDGER, CONCIL, CHAIN, OUT]:
         p.mkdir(parents=True, exist_ok=True)
@@ -62,19 +112,34 @@ def emit_extract(n: int = 14) -> Path:
     return path
 
 
-def canonicalize(src: Path) -> Path:
-    df = pd.read_csv(src)
-    # Ordenar por data, normalizar campos texto
-    df['date'] = pd.to_datetime(df['date']).dt.date.astype(str)
-    for c in ['description','category','counterparty']:
-        df[c] = df[c].astype(str).str.strip()
-    df['amount'] = df['amount'].astype(float).round(2)
-    df['balance'] = df['balance'].astype(float).round(2)
-    df = df.sort_values(['date','amount','description']).reset_index(drop=True)
-    out = PROCESSED / (src.stem + '.canonical.csv')
-    df.to_csv(out, index=False)
-    # Hash canônico (sha256 do CSV canônico)
-    h = hashlib.sha256(out.read_bytes()).hexdigest()
+def ingest_manifest_file() -> Path:
+    return DATA / 'ingest_manifest.jsonl'
+
+
+def load_ingest_manifest() -> dict[str, dict]:
+    # sha256 do arquivo de origem -> saídas (canônico/âncora); append-only, lido uma vez
+    p = ingest_manifest_file()
+    out = {}
+    if p.exists():
+        with p.open('r', encoding='utf-8') as f:
+            for line in f:
+                rec = json.loads(line)
+                out[rec['source_sha256']] = rec
+    return out
+
+
+def record_ingest(src_sha: str, src: Path, out: Path, h: str) -> None:
+    # A âncora é achada pelo sha256 do canônico (lookup/prove); o diário de pendentes é
+    # rotacionado a cada bloco, então não há arquivo nem offset estável para guardar
+    rec = {
+        'source_sha256': src_sha, 'source_file': src.name, 'canonical_file': out.name,
+        'sha256': h, 'timestamp': datetime.utcnow().isoformat()+'Z',
+    }
+    with ingest_manifest_file().open('a', encoding='utf-8') as f:
+        f.write(json.dumps(rec, ensure_ascii=False, separators=(',',':')) + '\n')
+
+
+def write_anchor(src: Path, out: Path, h: str) -> Path:
     anc = {
         'kind': 'bank_extract',
         'source_file': str(src.name),
@@ -82,14 +147,123 @@ def canonicalize(src: Path) -> Path:
         'sha256': h,
         'timestamp': datetime.utcnow().isoformat()+'Z'
     }
-    anc_path = ANCHORS / (src.stem + '.anchor.json')
-    anc_path.write_text(json.dumps(anc, ensure_ascii=False, separators=(',',':')))
+    # Uma linha no diário de pendentes (sem um arquivo por âncora)
+    journal = anchor_journal()
+    tx = tx_bytes_of(anc)
+    with journal.locked():
+        journal.append(tx)
+        absorb_anchors([tx], journal.size())
+    return journal.path
+
+
+def _canonicalize_job(job) -> tuple[str, int]:
+    # Executado nos workers: só escreve o canônico (e o sidecar); âncoras ficam no processo pai
+    from .canonical import write_canonical
+    src, out, chunk_rows = job
+    h, rows, runs = write_canonical(src, out, chunk_rows)
+    if runs == 1:
+        # Sidecar colunar para os próximos estágios; extratos grandes o geram na primeira leitura
+        write_sidecar(out, sha256=h)
+    return h, rows
+
+
+@metrics.stage('canonicalize')
+def canonicalize(src: Path, chunk_rows: int = 200_000, src_sha: str | None = None) -> Path:
+    out = PROCESSED / (src.stem + '.canonical.csv')
+    # Leitura em blocos + ordenação externa; hash canônico (sha256 do CSV canônico)
+    # calculado enquanto o arquivo é escrito
+    h, rows = _canonicalize_job((src, out, chunk_rows))
+    metrics.add_rows(rows)
+    anc_path = write_anchor(src, out, h)
+    record_ingest(src_sha or file_sha256(src), src, out, h)
     print(out, anc_path)
     return out
 
 
+@metrics.stage('ingest_all')
+def ingest_all(workers: int | None = None, chunk_rows: int = 200_000) -> list[Path]:
+    # Todo o inbox: arquivos cujo conteúdo já foi ingerido (manifesto) são pulados em O(1);
+    # canonicalização em paralelo, âncoras gravadas em ordem pelo processo pai
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    files = sorted(INBOX.glob('extrato_*.csv'))
+    with ThreadPoolExecutor() as tp:
+        shas = list(tp.map(file_sha256, files))
+    manifest = load_ingest_manifest()
+    pending, seen = [], set()
+    for src, sha in zip(files, shas):
+        if sha in manifest or sha in seen:
+            print('SKIP', src.name)
+            continue
+        seen.add(sha)
+        pending.append((src, sha))
+    outs = []
+    if not pending:
+        return outs
+    jobs = [(src, PROCESSED / (src.stem + '.canonical.csv'), chunk_rows) for src, _ in pending]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (src, sha), (_, out, _), (h, rows) in zip(pending, jobs, pool.map(_canonicalize_job, jobs)):
+            metrics.add_rows(rows)
+            anc_path = write_anchor(src, out, h)
+            record_ingest(sha, src, out, h)
+            print(out, anc_path)
+            outs.append(out)
+    return outs
+
+
+DOC_KINDS = ('document', 'receipt', 'invoice', 'report')
+
+
+def expand_paths(paths: list[Path]) -> list[Path]:
+    # Arquivos como dados; diretórios percorridos recursivamente (ordem estável)
+    out = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            out.extend(sorted(f for f in p.rglob('*') if f.is_file()))
+        elif p.is_file():
+            out.append(p)
+        else:
+            print('NOT_FOUND', p)
+    return out
+
+
+@metrics.stage('anchor_files')
+def anchor_files(paths: list[Path], kind: str = 'document', workers: int | None = None) -> list[dict]:
+    # Documentos avulsos (recibos, notas, relatórios PDF): sha256 em pool de threads (mmap/
+    # blocos, ver file_sha256) e uma âncora por conteúdo ainda não ancorado nem pendente
+    from concurrent.futures import ThreadPoolExecutor
+    if kind not in DOC_KINDS:
+        raise ValueError(f'unknown anchor kind {kind!r} (expected one of {DOC_KINDS})')
+    files = expand_paths(paths)
+    metrics.add_rows(len(files))
+    with ThreadPoolExecutor(max_workers=workers) as tp:
+        shas = list(tp.map(file_sha256, files))
+    journal = anchor_journal()
+    seen = {json.loads(ln).get('sha256') for ln in journal.lines()}
+    chain_file = CHAIN / 'chain.jsonl'
+    if chain_file.exists():
+        hits = AnchorIndex(chain_file).lookup_many(set(shas), ('sha256',))
+        seen.update(sha for sha, h in hits.items() if h)
+    anchors = []
+    ts = datetime.utcnow().isoformat()+'Z'
+    for p, sha in zip(files, shas):
+        if sha in seen:
+            print('SKIP', p.name)
+            continue
+        seen.add(sha)
+        anchors.append({'kind': kind, 'source_file': p.name, 'size': p.stat().st_size, 'sha256': sha, 'timestamp': ts})
+        print(p, sha)
+    if anchors:
+        txs = [tx_bytes_of(a) for a in anchors]
+        with journal.locked():
+            journal.extend(txs)
+            absorb_anchors(txs, journal.size())
+    return anchors
+
+
+@metrics.stage('build_ledger')
 def build_ledger_from_extract(canonical_csv: Path) -> Path:
-    df = pd.read_csv(canonical_csv)
+    df = read_table(canonical_csv)
+    metrics.add_rows(len(df))
     rows = []
     for i, r in enumerate(df.to_dict(orient='records'), start=1):
         desc = r['description'] + (' - ref' if i % 3 == 0 else '')
@@ -106,95 +280,167 @@ def build_ledger_from_extract(canonical_csv: Path) -> Path:
     with open(out, 'w', newline='', encoding='utf-8') as f:
         w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
         w.writeheader(); w.writerows(rows)
+    write_sidecar(out)
     print(out)
     return out
 
 
-def token_set(s: str):
-    return {t.lower() for t in str(s).replace('-', ' ').replace('/', ' ').split() if t}
-
-
-def jaccard(a: set, b: set) -> float:
-    if not a and not b:
-        return 1.0
-    inter = len(a & b)
-    union = len(a | b) or 1
-    return inter / union
-
-
-def reconcile(canonical_csv: Path, ledger_csv: Path, date_window_days=1, desc_thresh=0.4) -> Path:
-    import datetime as dt
-    ext = pd.read_csv(canonical_csv)
-    led = pd.read_csv(ledger_csv)
-    conc = []
-    for _, er in ext.iterrows():
-        e_date = dt.date.fromisoformat(str(er['date']))
-        e_amt = float(er['amount'])
-        e_desc = str(er['description'])
-        e_cp = str(er['counterparty'])
-        candidates = []
-        for _, lr in led.iterrows():
-            l_date = dt.date.fromisoformat(str(lr['date']))
-            l_amt = float(lr['amount'])
-            if abs((l_date - e_date).days) <= date_window_days and abs(l_amt - e_amt) < 1e-6:
-                d_sim = jaccard(token_set(e_desc), token_set(lr['description']))
-                candidates.append((d_sim, lr))
-        if candidates:
-            candidates.sort(key=lambda x: x[0], reverse=True)
-            d_sim, lr = candidates[0]
-            score = 0.5*1.0 + 0.3*1.0 + 0.2*float(d_sim)
-            status = 'matched' if score >= 0.85 and d_sim >= desc_thresh else ('manual_review' if score >= 0.6 else 'unmatched')
-            conc.append({
-                'tx_id_ledger': lr['tx_id'], 'date': er['date'], 'amount': e_amt,
-                'counterparty': e_cp, 'match_score': round(score, 2), 'status': status,
-            })
-        else:
-            conc.append({
-                'tx_id_ledger': '', 'date': er['date'], 'amount': e_amt,
-                'counterparty': e_cp, 'match_score': 0.0, 'status': 'unmatched',
-            })
+@metrics.stage('reconcile')
+def reconcile(canonical_csv: Path, ledger_csv: Path, date_window_days=1, desc_thresh=0.4, workers=1,
+              fuzzy=False, lsh_bands=16, lsh_rows=4, fuzzy_thresh=0.5, incremental=False,
+              amount_tol=0.0, amount_tol_pct=0.0, candidates=0) -> Path:
+    from .lsh import FUZZY_FIELDS, fuzzy_proposals
+    from .matching import (
+        CANDIDATE_FIELDS, CONC_FIELDS, match_frames, match_frames_parallel, match_incremental, ranked_candidates,
+    )
+    ext = read_table(canonical_csv)
+    led = read_table(ledger_csv)
+    metrics.add_rows(len(ext))
+    # Índice hash (centavos, bucket de data) sobre o ledger em vez do laço O(n·m);
+    # com tolerância de valor, varredura ordenada por (valor, data) com bisect
+    if incremental:
+        # Estado persistente em data/conciliation/: pares já conciliados não são refeitos
+        conc = match_incremental(ext, led, CONCIL, date_window_days, desc_thresh, workers, amount_tol, amount_tol_pct)
+    elif workers and workers > 1:
+        conc = match_frames_parallel(ext, led, date_window_days, desc_thresh, workers, amount_tol, amount_tol_pct)
+    else:
+        conc = match_frames(ext, led, date_window_days, desc_thresh, amount_tol, amount_tol_pct)
     out = CONCIL / (canonical_csv.stem + '.conciliation.csv')
     with open(out, 'w', newline='', encoding='utf-8') as f:
-        w = csv.DictWriter(f, fieldnames=list(conc[0].keys()))
+        w = csv.DictWriter(f, fieldnames=CONC_FIELDS)
         w.writeheader(); w.writerows(conc)
+    write_sidecar(out)
+    record_conciliation(report_model_file(), out, (r['status'] for r in conc))
     print(out)
+    if candidates:
+        ranked = ranked_candidates(ext, led, date_window_days, amount_tol, amount_tol_pct, top_k=candidates)
+        cand = CONCIL / (canonical_csv.stem + '.candidates.csv')
+        with open(cand, 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, fieldnames=CANDIDATE_FIELDS)
+            w.writeheader(); w.writerows(ranked)
+        print(cand)
+    if fuzzy:
+        # Sugestões aproximadas (MinHash/LSH) para linhas sem correspondência exata
+        props = fuzzy_proposals(ext, led, conc, bands=lsh_bands, rows=lsh_rows, min_sim=fuzzy_thresh)
+        fz = CONCIL / (canonical_csv.stem + '.fuzzy.csv')
+        with open(fz, 'w', newline='', encoding='utf-8') as f:
+            w = csv.DictWriter(f, fieldnames=FUZZY_FIELDS)
+            w.writeheader(); w.writerows(props)
+        print(fz)
     return out
 
 
 def merkle_root(items: list[bytes]) -> str:
-    if not items:
-        return hashlib.sha256(b'').hexdigest()
-    layer = [hashlib.sha256(x).digest() for x in items]
-    while len(layer) > 1:
-        if len(layer) % 2 == 1:
-            layer.append(layer[-1])
-        layer = [hashlib.sha256(layer[i] + layer[i+1]).digest() for i in range(0, len(layer), 2)]
-    return layer[0].hex()
+    return MerkleTree(items).root
+
+
+def tx_bytes_of(tx: dict) -> bytes:
+    return json.dumps(tx, separators=(',',':'), ensure_ascii=False).encode('utf-8')
+
+
+def merkle_levels_path(height: int) -> Path:
+    return CHAIN / 'merkle' / f'{height:08d}.bin'
+
+
+def anchor_journal() -> AnchorJournal:
+    return AnchorJournal(ANCHORS / 'pending.jsonl')
+
+
+def migrate_legacy_anchors() -> None:
+    # Âncoras antigas (um *.anchor.json por extrato) entram no diário e vão para archived/
+    legacy = sorted(ANCHORS.glob('*.anchor.json'))
+    if not legacy:
+        return
+    journal = anchor_journal()
+    archived_dir = ANCHORS / 'archived'
+    archived_dir.mkdir(exist_ok=True)
+    for p in legacy:
+        tx = tx_bytes_of(json.loads(p.read_text(encoding='utf-8')))
+        with journal.locked():
+            journal.append(tx)
+            absorb_anchors([tx], journal.size())
+        p.rename(archived_dir / p.name)
+
 
+def frontier_file() -> Path:
+    return ANCHORS / 'pending.frontier.json'
 
-def anchor_pending() -> list[Path]:
-    return sorted(ANCHORS.glob('*.anchor.json'))
 
+def load_frontier() -> tuple[MerkleFrontier, dict]:
+    p = frontier_file()
+    if p.exists():
+        meta = json.loads(p.read_text(encoding='utf-8'))
+        try:
+            return MerkleFrontier.from_dict(meta), meta
+        except ValueError:
+            pass
+    return MerkleFrontier(), {}
 
-def produce_block() -> Path | None:
-    pend = anchor_pending()
-    if not pend:
+
+def save_frontier(fr: MerkleFrontier, journal_size: int) -> None:
+    # journal_size amarra a fronteira ao conteúdo do diário que ela resume
+    state = fr.to_dict()
+    state['journal_size'] = journal_size
+    tmp = frontier_file().with_suffix('.tmp')
+    tmp.write_text(json.dumps(state), encoding='utf-8')
+    tmp.replace(frontier_file())
+
+
+def absorb_anchors(txs: list[bytes], journal_size: int) -> None:
+    # Cada âncora entra no acumulador Merkle ao ser gravada; o bloco só sela a fronteira.
+    # txs = últimas linhas acrescentadas ao diário, que agora tem journal_size bytes.
+    # Chamado com o lock do diário, junto com o append.
+    fr, meta = load_frontier()
+    if meta.get('journal_size', 0) != journal_size - sum(len(tx) + 1 for tx in txs):
+        # Fronteira não corresponde ao diário (ex.: diário editado): refaz a partir dele
+        fr = MerkleFrontier()
+        for ln in anchor_journal().lines():
+            fr.append(ln)
+    else:
+        for tx in txs:
+            fr.append(tx)
+    save_frontier(fr, journal_size)
+
+
+@metrics.stage('produce_block')
+def produce_block(policy: BlockPolicy | None = None) -> Path | None:
+    # Um selo por vez na cadeia (outro mine/anchor concorrente espera): o take/rotate de
+    # um não pode consumir o prefixo que o outro já selou
+    CHAIN.mkdir(parents=True, exist_ok=True)
+    with file_lock(CHAIN / 'chain.jsonl'):
+        return _produce_block(policy or BlockPolicy())
+
+
+def _produce_block(policy: BlockPolicy) -> Path | None:
+    migrate_legacy_anchors()
+    journal = anchor_journal()
+    with journal.locked():
+        size = journal.size()
+        # Uma leitura sequencial: prefixo que cabe no bloco + sobra + offset consumido
+        taken, rest, end = journal.take(policy)
+        fr, meta = load_frontier()
+    if not taken:
         print('NO_ANCHORS')
         return None
-    txs = [json.loads(p.read_text()) for p in pend]
-    tx_bytes = [json.dumps(tx, separators=(',',':'), ensure_ascii=False).encode('utf-8') for tx in txs]
-    mroot = merkle_root(tx_bytes)
+    txs = [json.loads(ln) for ln in taken]
+    metrics.add_rows(len(txs))
+    if not rest and fr.count == len(taken) and meta.get('journal_size') == size:
+        # Fronteira cobre exatamente as âncoras pendentes, na ordem do bloco: selo em O(log n);
+        # os níveis da árvore ficam para a primeira prova (anchor_proof)
+        tree = None
+        mroot = fr.root()
+    else:
+        tree = MerkleTree(taken)
+        mroot = tree.root
     prev = None
     chain_file = CHAIN / 'chain.jsonl'
+    store = ChainStore(chain_file)
     height = 0
-    if chain_file.exists():
-        last = None
-        with chain_file.open('r', encoding='utf-8') as f:
-            for line in f:
-                last = json.loads(line)
-        if last:
-            prev = last['block_hash']
-            height = last['height'] + 1
+    # Ponta da cadeia em O(1) (cache + índice), sem reler chain.jsonl
+    last = store.tip()
+    if last:
+        prev = last['block_hash']
+        height = last['height'] + 1
     block_header = {
         'height': height,
         'timestamp': datetime.utcnow().isoformat()+'Z',
@@ -202,89 +448,231 @@ def produce_block() -> Path | None:
         'merkle_root': mroot,
         'tx_count': len(txs),
     }
-    block_hash = hashlib.sha256(json.dumps(block_header, separators=(',',':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+    block_hash = header_hash(block_header)
     block = {
         **block_header,
         'block_hash': block_hash,
         'txs': txs,
     }
-    with chain_file.open('a', encoding='utf-8') as f:
-        f.write(json.dumps(block, ensure_ascii=False) + '\n')
-    archived_dir = ANCHORS / 'archived'
-    archived_dir.mkdir(exist_ok=True)
-    for p in pend:
-        p.rename(archived_dir / p.name)
+    store.append(block)
+    AnchorIndex(chain_file).add_block(block)
+    record_block(report_model_file(), chain_file, block)
+    # Níveis da árvore persistidos para provas de inclusão em O(log n)
+    if tree is not None:
+        tree.save(merkle_levels_path(height))
+    # Truncate (tudo selado) ou rotate (sobra e o que chegou durante o selo ficam para o
+    # próximo bloco), com a fronteira refeita, sob o lock dos appends
+    with journal.locked():
+        journal.rotate(end)
+        rest = journal.lines()
+        if rest:
+            fr = MerkleFrontier()
+            for ln in rest:
+                fr.append(ln)
+            save_frontier(fr, journal.size())
+        else:
+            frontier_file().unlink(missing_ok=True)
     print(chain_file)
     return chain_file
 
 
-def draw_table_image(img, x, y, w, h, headers, rows, font):
-    d = ImageDraw.Draw(img)
-    d.rectangle([x, y, x+w, y+40], fill=(225,231,240), outline=(180,180,180))
-    col_w = w // len(headers)
-    for i, htxt in enumerate(headers):
-        d.text((x + 10 + i*col_w, y + 10), str(htxt), fill=(20,20,20), font=font)
-        d.line([x + (i+1)*col_w, y, x + (i+1)*col_w, y+h], fill=(200,200,200))
-    d.rectangle([x, y, x+w, y+h], outline=(180,180,180))
-    row_h = 34
-    for r_i, row in enumerate(rows[: int((h-40)/row_h)]):
-        ry = y + 40 + r_i*row_h
-        if r_i % 2 == 0:
-            d.rectangle([x, ry, x+w, ry+row_h], fill=(248,250,252))
-        for c_i, val in enumerate(row[:len(headers)]):
-            d.text((x + 10 + c_i*col_w, ry + 8), str(val), fill=(30,30,30), font=font)
-
-
-def render_dashboards(canonical_csv: Path, conc_csv: Path):
-    OUT.mkdir(exist_ok=True)
-    # Extrato
-    W, H = 1400, 900
-    img = Image.new('RGB', (W, H), (247,248,250))
-    d = ImageDraw.Draw(img)
+def mine(policy: BlockPolicy, continuous: bool = False, poll: float = 1.0) -> int:
+    # Sem --continuous: esvazia o diário em quantos blocos a política exigir.
+    # Com --continuous: sela um bloco sempre que a política dispara (até Ctrl+C).
+    import time
+    journal = anchor_journal()
+    sealed = 0
     try:
-        title_font = ImageFont.truetype('arial.ttf', 32)
-        font = ImageFont.truetype('arial.ttf', 20)
-    except Exception:
-        title_font = ImageFont.load_default(); font = ImageFont.load_default()
-    d.rectangle([0,0,W,70], fill=(34,102,242))
-    d.text((20, 18), 'Extrato — Conta ONG (sandbox)', fill=(255,255,255), font=title_font)
-    df = pd.read_csv(canonical_csv)
-    headers = ['date','description','amount','balance','category','counterparty']
-    rows = df[headers].values.tolist()
-    draw_table_image(img, 40, 120, W-80, H-180, headers, rows, font)
-    img.save(OUT / 'extrato_dashboard.png')
-
-    # Conciliação
-    img2 = Image.new('RGB', (W, H), (247,248,250))
-    d2 = ImageDraw.Draw(img2)
-    d2.rectangle([0,0,W,70], fill=(16,130,90))
-    d2.text((20, 18), 'Conciliação — Ledger x Extrato', fill=(255,255,255), font=title_font)
-    cdf = pd.read_csv(conc_csv)
-    headers2 = ['tx_id_ledger','date','amount','counterparty','match_score','status']
-    rows2 = cdf[headers2].values.tolist()
-    draw_table_image(img2, 40, 120, W-80, 520, headers2, rows2, font)
-    matched = (cdf['status']=='matched').mean()*100
-    d2.rectangle([40, 670, 500, 830], fill=(255,255,255), outline=(200,200,200))
-    d2.text((60, 690), 'Resumo', fill=(0,0,0), font=font)
-    d2.text((60, 730), f'Taxa de conciliação: {matched:.1f}%', fill=(0,0,0), font=font)
-    img2.save(OUT / 'conciliacao_dashboard.png')
-
-    print(OUT / 'extrato_dashboard.png', OUT / 'conciliacao_dashboard.png')
+        while True:
+            migrate_legacy_anchors()
+            count, nbytes, age = journal.stats()
+            if continuous and not policy.due(count, nbytes, age):
+                time.sleep(poll)
+                continue
+            if not count:
+                break
+            produce_block(policy)
+            sealed += 1
+    except KeyboardInterrupt:
+        pass
+    return sealed
+
+
+def find_anchor(anchor: dict | str) -> tuple[dict, int] | None:
+    # Índice de âncoras (sha256 -> altura, tx); aceita a âncora ou o sha256.
+    # Ocorrências mais recentes primeiro.
+    chain_file = CHAIN / 'chain.jsonl'
+    if not chain_file.exists():
+        return None
+    sha = anchor.get('sha256') if isinstance(anchor, dict) else anchor
+    store = ChainStore(chain_file)
+    for _f, h, i in sorted(AnchorIndex(chain_file).lookup(sha, ('sha256',)), key=lambda r: -r[1]):
+        b = store.get(h)
+        if not isinstance(anchor, dict) or b['txs'][i] == anchor:
+            return b, i
+    return None
+
+
+def lookup_anchor(value: str, fields: tuple[str, ...] = ANCHOR_KEYS, height: int | None = None) -> list[dict]:
+    # Bloco e posição Merkle de cada ocorrência (sha256, source_file ou canonical_file).
+    # Com height: só aquele bloco; o Bloom responde "não está" sem ler o bloco.
+    chain_file = CHAIN / 'chain.jsonl'
+    if not chain_file.exists():
+        return []
+    index = AnchorIndex(chain_file)
+    if height is not None:
+        index.sync()
+        if not any(index.may_contain(height, f, value) for f in fields):
+            return []
+    hits = index.lookup(value, fields)
+    store = ChainStore(chain_file)
+    out = []
+    for f, h, i in hits:
+        if height is not None and h != height:
+            continue
+        b = store.get(h)
+        out.append({
+            'field': f, 'height': h, 'block_hash': b['block_hash'], 'merkle_root': b['merkle_root'],
+            'tx_index': i, 'tx_count': b['tx_count'], 'tx': b['txs'][i],
+        })
+    return out
+
+
+def anchor_arg(value: str) -> dict | str:
+    # Argumento de prove/lookup: âncora JSON legada (*.anchor.json), um arquivo qualquer
+    # (recibo, PDF...: vale o sha256 do conteúdo; extrato de origem já ingerido: o sha256
+    # do canônico, que é o que foi ancorado) ou o próprio valor (sha256/nome)
+    p = Path(value)
+    if not p.is_file():
+        return value
+    if p.name.endswith('.anchor.json'):
+        try:
+            anc = json.loads(p.read_text(encoding='utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            anc = None
+        if isinstance(anc, dict) and 'sha256' in anc:
+            return anc
+    sha = file_sha256(p)
+    rec = load_ingest_manifest().get(sha)
+    return rec['sha256'] if rec else sha
+
 
+def proof_on_chain(store: ChainStore, doc: dict, headers: dict) -> bool:
+    # A prova só vale se a merkle_root (e o block_hash, se presente) for a do bloco da cadeia
+    # local na altura declarada; senão uma prova forjada mas coerente consigo mesma passaria.
+    # headers: cache altura -> (merkle_root, block_hash) entre provas do mesmo bloco
+    h = doc.get('height')
+    if h not in headers:
+        found = store.blocks(h, h + 1) if isinstance(h, int) else []
+        b = found[0][1] if found else None
+        headers[h] = (b.get('merkle_root'), b.get('block_hash')) if b else None
+    local = headers[h]
+    return local is not None and local[0] == doc['merkle_root'] and doc.get('block_hash') in (None, local[1])
+
+
+def anchor_proof(anchor: dict | str) -> dict | None:
+    hit = find_anchor(anchor)
+    if hit is None:
+        return None
+    block, idx = hit
+    levels = merkle_levels_path(block['height'])
+    if not levels.exists():
+        # Blocos antigos (sem níveis salvos): reconstrói uma vez e persiste
+        MerkleTree([tx_bytes_of(tx) for tx in block['txs']]).save(levels)
+    root, path = proof_from_file(levels, idx)
+    if root != block['merkle_root']:
+        raise ValueError(f"merkle levels of block {block['height']} do not match its merkle_root")
+    return {
+        'height': block['height'],
+        'block_hash': block['block_hash'],
+        'merkle_root': root,
+        'tx_index': idx,
+        'tx': block['txs'][idx],
+        'proof': path,
+    }
+
+
+@metrics.stage('verify_chain')
+def verify_chain(workers: int | None = None, full: bool = False, chunk: int = 256) -> dict:
+    # Hash de cada bloco (block_hash + merkle_root) em paralelo; ligação prev_hash numa
+    # passada sequencial. O checkpoint guarda a última altura verificada.
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    import itertools
+    import time
+    chain_file = CHAIN / 'chain.jsonl'
+    ckpt_file = CHAIN / 'verify.checkpoint.json'
+    store = ChainStore(chain_file)
+    total = len(store) if chain_file.exists() else 0
+    start, prev = 0, None
+    if not full and ckpt_file.exists():
+        ck = json.loads(ckpt_file.read_text(encoding='utf-8'))
+        # Só confia no checkpoint se o bloco dele ainda é o mesmo
+        if ck['height'] < total and store.block_hash(ck['height']) == ck['block_hash']:
+            start, prev = ck['height'] + 1, ck['block_hash']
+    t0 = time.perf_counter()
+    bad, reason, verified = None, None, start
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Janela limitada de lotes em voo (um novo a cada resultado): a cadeia é lida e
+        # serializada conforme os workers consomem, e o primeiro bloco ruim cancela o resto
+        starts = iter(range(start, total, chunk))
+        window = deque()
+
+        def submit(n: int) -> None:
+            for i in itertools.islice(starts, n):
+                window.append(pool.submit(check_blocks, store.raw_range(i, min(i + chunk, total))))
+
+        submit(2 * (workers or os.cpu_count() or 1))
+        expected = start
+        while window:
+            results = window.popleft().result()
+            submit(1)
+            for h, bh, ph, err in results:
+                if err is None and h != expected:
+                    err = f'height {h} at position {expected}'
+                if err is None and ph != prev:
+                    err = 'prev_hash does not link to previous block'
+                if err is not None:
+                    bad, reason = expected, err
+                    break
+                prev = bh
+                expected += 1
+            if bad is not None:
+                break
+        pool.shutdown(cancel_futures=True)
+        verified = expected
+    elapsed = time.perf_counter() - t0
+    if verified > start:
+        ckpt_file.write_text(json.dumps({
+            'height': verified - 1, 'block_hash': prev,
+            'timestamp': datetime.utcnow().isoformat()+'Z',
+        }), encoding='utf-8')
+    checked = verified - start + (1 if bad is not None else 0)
+    metrics.add_rows(checked)
+    return {
+        'blocks': total, 'start': start, 'checked': checked, 'seconds': round(elapsed, 3),
+        'blocks_per_s': round(checked / elapsed, 1) if elapsed > 0 else None,
+        'first_corrupt_height': bad, 'reason': reason,
+    }
 
+
+@metrics.stage('render_dashboards')
+def render_dashboards(canonical_csv: Path, conc_csv: Path, workers: int | None = None,
+                      only_changed: bool = False) -> tuple[Path, ...]:
+    # Páginas em OUT (extrato_dashboard_p001.png, ...); ver dashboards.py
+    from .dashboards import render_dashboards as _render_dashboards
+    return _render_dashboards(canonical_csv, conc_csv, OUT, workers=workers, only_changed=only_changed)
+
+
+@metrics.stage('report_html')
 def generate_report_html(canonical_csv: Path, conc_csv: Path, chain_file: Path | None) -> Path:
     OUT.mkdir(exist_ok=True)
-    dfc = pd.read_csv(conc_csv)
-    matched = (dfc['status'] == 'matched').sum()
-    manual = (dfc['status'] == 'manual_review').sum()
-    unmatched = (dfc['status'] == 'unmatched').sum()
-    total = len(dfc)
-    pct = (matched/total*100) if total else 0.0
-    blocks = []
-    if chain_file and chain_file.exists():
-        with chain_file.open('r', encoding='utf-8') as f:
-            for line in f:
-                blocks.append(json.loads(line))
+    model = report_model(report_model_file(), conc_csv, chain_file)
+    c = model['conciliation']
+    matched, manual, unmatched = c['counts']['matched'], c['counts']['manual_review'], c['counts']['unmatched']
+    total, pct = c['total'], c['match_rate']
+    metrics.add_rows(total)
+    blocks = model['chain']['blocks'] if chain_file else []
     last = blocks[-1] if blocks else None
     rows_html = ''.join(
         '<tr><td>{height}</td><td>{ts}</td><td>{txs}</td><td><code>{mr}</code></td><td><code>{bh}</code></td></tr>'.format(
@@ -335,35 +723,38 @@ def generate_report_html(canonical_csv: Path, conc_csv: Path, chain_file: Path |
  </table>
  {last_block_html}
 </div>
-<p class=muted>Dados sintéticos; âncoras: arquivos em data/anchors (archived após mineração). Este relatório referencia imagens em out/.</p>
+<p class=muted>Dados sintéticos; âncoras: diário data/anchors/pending.jsonl (esvaziado a cada bloco). Este relatório referencia imagens em out/.</p>
 """.format(matched=matched, total=total, pct=pct, manual=manual, unmatched=unmatched, chain_name=chain_name, rows_html=rows_html, last_block_html=last_block_html)
     out = OUT / 'report_blockchain.html'
     out.write_text(html, encoding='utf-8')
     return out
 
 
+@metrics.stage('report_pdf')
 def generate_report_pdf(canonical_csv: Path, conc_csv: Path, chain_file: Path | None) -> Path | None:
-    if not REPORTLAB_AVAILABLE:
+    if not reportlab_available():
         return None
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
     ss = getSampleStyleSheet()
     ss.add(ParagraphStyle(name='TitleBig', parent=ss['Title'], fontSize=16, leading=20, spaceAfter=6))
     ss.add(ParagraphStyle(name='Body', parent=ss['BodyText'], fontSize=10.5, leading=14))
     pdf = OUT / 'report_blockchain.pdf'
     story = []
     story += [Paragraph('Relatório da Blockchain (Simulada)', ss['TitleBig'])]
-    dfc = pd.read_csv(conc_csv)
-    matched = (dfc['status']=='matched').sum(); manual = (dfc['status']=='manual_review').sum(); unmatched = (dfc['status']=='unmatched').sum(); total = len(dfc)
-    pct = (matched/total*100) if total else 0
+    model = report_model(report_model_file(), conc_csv, chain_file)
+    c = model['conciliation']
+    matched, manual, unmatched = c['counts']['matched'], c['counts']['manual_review'], c['counts']['unmatched']
+    total, pct = c['total'], c['match_rate']
+    metrics.add_rows(total)
     story += [Paragraph(f'Conciliação: {matched}/{total} matched ({pct:.1f}%), {manual} revisão, {unmatched} sem correspondência.', ss['Body']), Spacer(1,6)]
     if (OUT/'extrato_dashboard.png').exists():
         story += [RLImage(str(OUT/'extrato_dashboard.png'), width=480, height=280)]
     if (OUT/'conciliacao_dashboard.png').exists():
         story += [Spacer(1,6), RLImage(str(OUT/'conciliacao_dashboard.png'), width=480, height=280)]
-    blocks = []
-    if chain_file and chain_file.exists():
-        with chain_file.open('r', encoding='utf-8') as f:
-            for line in f:
-                blocks.append(json.loads(line))
+    blocks = model['chain']['blocks'] if chain_file else []
     if blocks:
         data = [["Altura","Timestamp","Txs","Merkle root","Block hash"]]
         for b in blocks[-10:]:
@@ -380,32 +771,265 @@ def generate_report_pdf(canonical_csv: Path, conc_csv: Path, chain_file: Path |
     return pdf
 
 
-def run_all():
+def generate_reports(canonical_csv: Path, conc_csv: Path, chain_file: Path | None) -> tuple[Path, Path | None]:
+    # HTML e PDF em paralelo: ambos só leem o modelo (atualizado aqui uma vez) e os PNGs
+    from concurrent.futures import ThreadPoolExecutor
+    report_model(report_model_file(), conc_csv, chain_file)
+    if metrics.profiling():
+        # cProfile mede uma thread por vez: em --profile os dois saem em sequência
+        return generate_report_html(canonical_csv, conc_csv, chain_file), generate_report_pdf(canonical_csv, conc_csv, chain_file)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        html = pool.submit(generate_report_html, canonical_csv, conc_csv, chain_file)
+        pdf = pool.submit(generate_report_pdf, canonical_csv, conc_csv, chain_file)
+        return html.result(), pdf.result()
+
+
+def canonicalize_once(src: Path) -> Path:
+    # Conteúdo já ingerido (manifesto) não é canonicalizado nem ancorado de novo
+    src_sha = file_sha256(src)
+    rec = load_ingest_manifest().get(src_sha)
+    if rec and (PROCESSED / rec['canonical_file']).exists():
+        return PROCESSED / rec['canonical_file']
+    return canonicalize(src, src_sha=src_sha)
+
+
+def pipeline_stages(reuse_extract: bool = False, date_window_days=1, desc_thresh=0.4) -> list[Stage]:
+    chain_file = CHAIN / 'chain.jsonl'
+
+    def extract():
+        files = sorted(INBOX.glob('extrato_*.csv'))
+        return files[-1] if reuse_extract and files else emit_extract()
+
+    def block(_canon):
+        return produce_block() or (chain_file if chain_file.exists() else None)
+
+    def chain_tip(_):
+        # A cadeia entra na chave dos relatórios pelo hash da ponta (O(1)), não pelo arquivo
+        tip = ChainStore(chain_file).tip() if chain_file.exists() else None
+        return tip['block_hash'] if tip else None
+
+    def reports(canon, conc, chain, _dashboards):
+        return generate_reports(canon, conc, chain)
+
+    return [
+        Stage('extract', extract, cache=False),
+        Stage('canonical', canonicalize_once, ('extract',)),
+        Stage('ledger', build_ledger_from_extract, ('canonical',)),
+        Stage('conciliation', reconcile, ('canonical', 'ledger'),
+              {'date_window_days': date_window_days, 'desc_thresh': desc_thresh}),
+        Stage('block', block, ('canonical',), cache=False, fingerprint=chain_tip),
+        Stage('dashboards', render_dashboards, ('canonical', 'conciliation'), {'only_changed': True}),
+        Stage('reports', reports, ('canonical', 'conciliation', 'block', 'dashboards')),
+    ]
+
+
+def run_pipeline(reuse_extract: bool = False, use_cache: bool = True, progress=None,
+                 cancel=None, only: tuple[str, ...] | None = None) -> tuple[dict, list[str]]:
+    # progress/cancel: ver pipeline.run_dag (usados pela GUI, que roda isto fora da thread do Tk).
+    # only: subconjunto de estágios (fechado sob dependências), ex. sem block/reports.
     ensure_dirs()
-    src = emit_extract()
-    canon = canonicalize(src)
-    ledger = build_ledger_from_extract(canon)
-    conc = reconcile(canon, ledger)
-    chain_file = produce_block()
-    render_dashboards(canon, conc)
-    html = generate_report_html(canon, conc, chain_file)
-    pdf = generate_report_pdf(canon, conc, chain_file)
+    cache = StageCache(DATA / 'stage_cache.json') if use_cache else None
+    stages = [st for st in pipeline_stages(reuse_extract) if only is None or st.name in only]
+    return run_dag(stages, cache, progress=progress, cancel=cancel)
+
+
+def run_all(reuse_extract: bool = False, use_cache: bool = True):
+    results, skipped = run_pipeline(reuse_extract, use_cache)
+    html, pdf = results['reports']
     print(html)
     if pdf:
         print(pdf)
+    if skipped:
+        print('CACHED', ','.join(skipped))
+
+
+def load_tenants(path: Path) -> list[tuple[str, Path]]:
+    # [{"name": "ong-a", "root": "contas/ong-a"}, ...]; root relativo ao tenants.json
+    # (padrão: o próprio nome)
+    out, roots = [], set()
+    for t in json.loads(Path(path).read_text(encoding='utf-8')):
+        root = Path(t.get('root') or t['name'])
+        root = (root if root.is_absolute() else Path(path).parent / root).resolve()
+        if t['name'] in dict(out) or root in roots:
+            raise ValueError(f"duplicate tenant name or root: {t['name']!r} ({root})")
+        roots.add(root)
+        out.append((t['name'], root))
+    return out
+
+
+def _tenant_log():
+    # Saída dos estágios de cada conta em <raiz>/out/run-all.log (não intercala no terminal)
+    OUT.mkdir(parents=True, exist_ok=True)
+    return open(OUT / 'run-all.log', 'a', encoding='utf-8')
+
+
+def _tenant_pipeline(job) -> tuple[dict, list[str]]:
+    # Executado no pool: rebinda as raízes para a conta e roda o DAG dela
+    name, root, reuse_extract, use_cache, only = job
+    with using_root(root), _tenant_log() as log, contextlib.redirect_stdout(log):
+        return run_pipeline(reuse_extract, use_cache, only=only)
+
+
+def _tenant_reports(job) -> tuple[Path, Path | None]:
+    name, root, canonical_csv, conc_csv, chain_file = job
+    with using_root(root), _tenant_log() as log, contextlib.redirect_stdout(log):
+        return generate_reports(canonical_csv, conc_csv, chain_file)
+
+
+def seal_shared_block(tenants: list[tuple[str, Path]]) -> Path | None:
+    # Âncoras pendentes de todas as contas num único bloco da cadeia da raiz atual, cada
+    # transação marcada com 'tenant'. Os diários das contas só são esvaziados depois que
+    # as âncoras estão no diário compartilhado.
+    txs, drained = [], []
+    for name, root in tenants:
+        with using_root(root):
+            migrate_legacy_anchors()
+            journal = anchor_journal()
+            lines, _rest, end = journal.take()
+            if lines:
+                txs += [tx_bytes_of({**json.loads(ln), 'tenant': name}) for ln in lines]
+                drained.append((journal, frontier_file(), end))
+    ensure_dirs()
+    journal = anchor_journal()
+    if txs:
+        with journal.locked():
+            journal.extend(txs)
+            absorb_anchors(txs, journal.size())
+        for j, fr, end in drained:
+            # Só o que foi copiado sai do diário da conta; a fronteira é refeita no próximo append
+            with j.locked():
+                j.rotate(end)
+                fr.unlink(missing_ok=True)
+    count = journal.stats()[0]
+    return produce_block(BlockPolicy(max_txs=max(count, 1), max_bytes=1 << 62))
+
+
+async def _run_tenants(tenants, reuse_extract, use_cache, workers, shared_chain) -> dict:
+    # Uma corrotina por conta sobre um pool de processos limitado; falha de uma conta
+    # não derruba as outras. Com shared_chain: DAG sem block/reports em paralelo, um bloco
+    # com as âncoras de todas, e os relatórios de cada conta apontando para essa cadeia.
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor
+    loop = asyncio.get_running_loop()
+    only = tuple(st.name for st in pipeline_stages() if st.name not in ('block', 'reports')) if shared_chain else None
+    done = {}
+
+    async def call(pool, fn, job):
+        try:
+            return await loop.run_in_executor(pool, fn, job)
+        except Exception as e:
+            print('FAILED', job[0], f'{type(e).__name__}: {e}')
+            return None
+
+    async def pipeline(pool, name, root):
+        r = await call(pool, _tenant_pipeline, (name, root, reuse_extract, use_cache, only))
+        if r is not None:
+            done[name] = r
+            if not shared_chain:
+                _print_tenant(name, *r)
+
+    with ProcessPoolExecutor(max_workers=workers or min(len(tenants), os.cpu_count() or 1)) as pool:
+        await asyncio.gather(*(pipeline(pool, name, root) for name, root in tenants))
+        if shared_chain and done:
+            block = seal_shared_block([(n, r) for n, r in tenants if n in done])
+            chain_file = CHAIN / 'chain.jsonl'
+            print('SHARED', block or chain_file)
+
+            async def reports(name, root):
+                results, skipped = done[name]
+                r = await call(pool, _tenant_reports, (name, root, results['canonical'], results['conciliation'],
+                                                       chain_file if chain_file.exists() else None))
+                if r is None:
+                    del done[name]
+                else:
+                    results['reports'] = r
+                    _print_tenant(name, results, skipped)
+            await asyncio.gather(*(reports(name, root) for name, root in tenants if name in done))
+    return done
+
+
+def _print_tenant(name: str, results: dict, skipped: list[str]) -> None:
+    html, pdf = results['reports']
+    print(name, html, *([pdf] if pdf else []), *(['CACHED', ','.join(skipped)] if skipped else []))
+
+
+def run_tenants(tenants_file: Path, reuse_extract: bool = False, use_cache: bool = True,
+                workers: int | None = None, shared_chain: bool = False) -> dict:
+    import asyncio
+    tenants = load_tenants(tenants_file)
+    done = asyncio.run(_run_tenants(tenants, reuse_extract, use_cache, workers, shared_chain))
+    if len(done) < len(tenants):
+        raise SystemExit(1)
+    return done
 
 
 def main():
     parser = argparse.ArgumentParser(description='Blockchain ONG Integration Simulator')
+    parser.add_argument('--metrics', type=Path, help='grava métricas por estágio em JSON-lines neste arquivo (e o .prom ao lado)')
+    parser.add_argument('--profile', action='store_true', help='grava um .pstats (cProfile) por estágio')
+    parser.add_argument('--profile-dir', type=Path, default=OUT / 'profile', help='diretório dos .pstats (padrão: out/profile)')
     sub = parser.add_subparsers(dest='cmd')
     sub.add_parser('emit-extract')
-    sub.add_parser('ingest')
-    sub.add_parser('reconcile')
-    sub.add_parser('anchor')
-    sub.add_parser('render-dashboards')
+    p_ing = sub.add_parser('ingest')
+    p_ing.add_argument('--chunk-rows', type=int, default=200_000, help='linhas por bloco na ordenação externa')
+    p_ing.add_argument('--all', action='store_true', help='processa todos os extratos pendentes do inbox')
+    p_ing.add_argument('--workers', type=int, default=None, help='processos para --all (padrão: núcleos)')
+    p_rec = sub.add_parser('reconcile')
+    p_rec.add_argument('--workers', type=int, default=1, help='processos para conciliação em fatias de datas')
+    p_rec.add_argument('--amount-tol', type=float, default=0.0, help='tolerância absoluta de valor (ex.: 0.50)')
+    p_rec.add_argument('--amount-tol-pct', type=float, default=0.0, help='tolerância percentual de valor (ex.: 1.5)')
+    p_rec.add_argument('--candidates', type=int, default=0, help='grava os K melhores candidatos por linha em *.candidates.csv')
+    p_rec.add_argument('--incremental', action='store_true', help='usa o estado persistente em data/conciliation/ e só concilia linhas novas/abertas')
+    p_rec.add_argument('--fuzzy', action='store_true', help='sugere candidatos por descrição (MinHash/LSH) para linhas unmatched')
+    p_rec.add_argument('--lsh-bands', type=int, default=16, help='mais bandas = mais recall')
+    p_rec.add_argument('--lsh-rows', type=int, default=4, help='mais linhas por banda = mais precisão')
+    p_rec.add_argument('--fuzzy-thresh', type=float, default=0.5, help='Jaccard mínimo das sugestões')
+    p_anc = sub.add_parser('anchor')
+    p_mine = sub.add_parser('mine')
+    for p in (p_anc, p_mine):
+        p.add_argument('--max-txs', type=int, default=1000, help='máximo de transações por bloco')
+        p.add_argument('--max-bytes', type=int, default=1_000_000, help='máximo de bytes de transações por bloco')
+    p_mine.add_argument('--continuous', action='store_true', help='fica ativo e sela blocos quando a política dispara')
+    p_mine.add_argument('--max-wait', type=float, default=60.0, help='segundos máximos de espera da âncora mais antiga')
+    p_mine.add_argument('--poll', type=float, default=1.0, help='intervalo de consulta do diário em segundos')
+    p_af = sub.add_parser('anchor-files')
+    p_af.add_argument('paths', nargs='+', type=Path, help='arquivos ou diretórios (recursivo) a ancorar')
+    p_af.add_argument('--kind', choices=DOC_KINDS, default='document', help='tipo gravado na âncora')
+    p_af.add_argument('--workers', type=int, default=None, help='threads de hashing (padrão: núcleos + 4, até 32)')
+    p_prove = sub.add_parser('prove')
+    p_prove.add_argument('anchor', help='sha256 ancorado, documento ancorado (pelo sha256 do conteúdo) ou *.anchor.json')
+    p_prove.add_argument('-o', '--output', help='grava a prova JSON neste arquivo')
+    p_lk = sub.add_parser('lookup')
+    p_lk.add_argument('value', nargs='?', help='sha256, source_file ou canonical_file da âncora, ou um arquivo (pelo sha256 do conteúdo)')
+    p_lk.add_argument('--field', choices=ANCHOR_KEYS, help='procura só neste campo')
+    p_lk.add_argument('--block', type=int, help='só responde para esta altura (filtro de Bloom)')
+    p_lk.add_argument('--rebuild', action='store_true', help='reconstrói o índice a partir de chain.jsonl')
+    p_vp = sub.add_parser('verify-proof')
+    p_vp.add_argument('proofs', nargs='+', help='arquivos JSON gerados por prove')
+    p_vc = sub.add_parser('verify-chain')
+    p_vc.add_argument('--workers', type=int, default=None, help='processos para hashing (padrão: núcleos)')
+    p_vc.add_argument('--full', action='store_true', help='ignora o checkpoint e verifica desde o bloco 0')
+    p_dash = sub.add_parser('render-dashboards')
+    p_dash.add_argument('--workers', type=int, default=None, help='processos para renderizar as páginas (padrão: núcleos)')
+    p_dash.add_argument('--changed-only', action='store_true', help='só renderiza as páginas cujas linhas mudaram desde a última execução')
     sub.add_parser('report')
-    sub.add_parser('run-all')
+    p_all = sub.add_parser('run-all')
+    p_all.add_argument('--reuse-extract', action='store_true', help='usa o extrato mais recente do inbox em vez de emitir um novo')
+    p_all.add_argument('--no-cache', action='store_true', help='reexecuta todos os estágios')
+    p_all.add_argument('--tenants', type=Path, help='JSON com as contas [{"name", "root"}, ...]; roda o pipeline de cada uma em paralelo')
+    p_all.add_argument('--tenant-workers', type=int, default=None, help='processos do pool de contas (padrão: min(contas, núcleos))')
+    p_all.add_argument('--shared-chain', action='store_true', help='com --tenants: sela as âncoras de todas as contas num único bloco da cadeia do diretório atual')
     args = parser.parse_args()
+    metrics.configure(args.metrics, args.profile_dir if args.profile else None)
+    try:
+        _run_command(args)
+    finally:
+        prom = metrics.finish()
+        if prom is not None:
+            print(args.metrics, prom)
+
+
+def _run_command(args):
     ensure_dirs()
     if args.cmd == 'emit-extract':
         emit_extract()
@@ -414,23 +1038,97 @@ def main():
         if not files:
             print('NO_INBOX')
             return
-        canonicalize(files[-1])
+        if args.all:
+            ingest_all(workers=args.workers, chunk_rows=args.chunk_rows)
+            return
+        src_sha = file_sha256(files[-1])
+        if src_sha in load_ingest_manifest():
+            print('ALREADY_INGESTED', files[-1].name)
+            return
+        canonicalize(files[-1], chunk_rows=args.chunk_rows, src_sha=src_sha)
     elif args.cmd == 'reconcile':
         canons = sorted(PROCESSED.glob('*.canonical.csv'))
         if not canons:
             print('NO_CANON')
             return
         ledger = build_ledger_from_extract(canons[-1])
-        reconcile(canons[-1], ledger)
+        reconcile(canons[-1], ledger, workers=args.workers, fuzzy=args.fuzzy,
+                  lsh_bands=args.lsh_bands, lsh_rows=args.lsh_rows, fuzzy_thresh=args.fuzzy_thresh,
+                  incremental=args.incremental, amount_tol=args.amount_tol,
+                  amount_tol_pct=args.amount_tol_pct, candidates=args.candidates)
     elif args.cmd == 'anchor':
-        produce_block()
+        produce_block(BlockPolicy(args.max_txs, args.max_bytes))
+    elif args.cmd == 'anchor-files':
+        anchors = anchor_files(args.paths, kind=args.kind, workers=args.workers)
+        print('ANCHORED', len(anchors))
+    elif args.cmd == 'mine':
+        n = mine(BlockPolicy(args.max_txs, args.max_bytes, args.max_wait), args.continuous, args.poll)
+        print('SEALED', n)
+    elif args.cmd == 'prove':
+        doc = anchor_proof(anchor_arg(args.anchor))
+        if doc is None:
+            print('NOT_ANCHORED')
+            return
+        text = json.dumps(doc, ensure_ascii=False, indent=1)
+        if args.output:
+            Path(args.output).write_text(text, encoding='utf-8')
+            print(args.output)
+        else:
+            print(text)
+    elif args.cmd == 'lookup':
+        chain_file = CHAIN / 'chain.jsonl'
+        if args.rebuild and chain_file.exists():
+            print('INDEXED', AnchorIndex(chain_file).rebuild())
+        if args.value is None:
+            return
+        fields = (args.field,) if args.field else ANCHOR_KEYS
+        ref = anchor_arg(args.value)
+        if isinstance(ref, dict):
+            ref = ref['sha256']
+        hits = lookup_anchor(args.value, fields, args.block)
+        if ref != args.value:
+            # Arquivo local: pelo nome (o índice guarda só o nome, sem diretório) e pelo
+            # sha256 ancorado; a mesma transação achada pelos dois aparece uma vez
+            name = Path(args.value).name
+            if name != args.value:
+                hits += lookup_anchor(name, tuple(f for f in fields if f != 'sha256'), args.block)
+            if 'sha256' in fields:
+                hits += lookup_anchor(ref, ('sha256',), args.block)
+            seen = set()
+            hits = [h for h in hits if not ((h['height'], h['tx_index']) in seen or seen.add((h['height'], h['tx_index'])))]
+        if not hits:
+            print('NOT_ANCHORED')
+            return
+        print(json.dumps(hits, ensure_ascii=False, indent=1))
+    elif args.cmd == 'verify-proof':
+        docs = [json.loads(Path(p).read_text(encoding='utf-8')) for p in args.proofs]
+        # Provas do mesmo bloco são verificadas em lote (nós compartilhados hasheados uma vez)
+        by_root = {}
+        for p, d in zip(args.proofs, docs):
+            by_root.setdefault(d['merkle_root'], []).append((p, d))
+        # Com cadeia local, a raiz também é conferida contra o bloco da altura declarada
+        chain_file = CHAIN / 'chain.jsonl'
+        store = ChainStore(chain_file) if chain_file.exists() else None
+        headers = {}
+        for root, group in by_root.items():
+            oks = verify_batch([(tx_bytes_of(d['tx']), d['proof']) for _, d in group], root)
+            for (p, d), ok in zip(group, oks):
+                if ok and store is not None and not proof_on_chain(store, d, headers):
+                    print(p, d['height'], 'NOT_IN_CHAIN')
+                    continue
+                print(p, d['height'], 'OK' if ok else 'INVALID')
+    elif args.cmd == 'verify-chain':
+        rep = verify_chain(workers=args.workers, full=args.full)
+        print(json.dumps(rep, ensure_ascii=False))
+        if rep['first_corrupt_height'] is not None:
+            raise SystemExit(1)
     elif args.cmd == 'render-dashboards':
         canons = sorted(PROCESSED.glob('*.canonical.csv'))
         conz = sorted(CONCIL.glob('*.conciliation.csv'))
         if not (canons and conz):
             print('NO_DATA')
             return
-        render_dashboards(canons[-1], conz[-1])
+        render_dashboards(canons[-1], conz[-1], workers=args.workers, only_changed=args.changed_only)
     elif args.cmd == 'report':
         canons = sorted(PROCESSED.glob('*.canonical.csv'))
         conz = sorted(CONCIL.glob('*.conciliation.csv'))
@@ -438,11 +1136,15 @@ def main():
         if not (canons and conz and chain_file.exists()):
             print('NO_DATA')
             return
-        html = generate_report_html(canons[-1], conz[-1], chain_file)
-        pdf = generate_report_pdf(canons[-1], conz[-1], chain_file)
+        html, pdf = generate_reports(canons[-1], conz[-1], chain_file)
         print(html)
         if pdf:
             print(pdf)
+    elif args.cmd == 'run-all' and args.tenants:
+        run_tenants(args.tenants, reuse_extract=args.reuse_extract, use_cache=not args.no_cache,
+                    workers=args.tenant_workers, shared_chain=args.shared_chain)
+    elif args.cmd == 'run-all':
+        run_all(reuse_extract=args.reuse_extract, use_cache=not args.no_cache)
     else:
         run_all()
 
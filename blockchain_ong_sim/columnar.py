@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+from pathlib import Path
+
+# Sidecar colunar ao lado de cada CSV (X.csv -> X.csv.cols/): um .npy por coluna numérica,
+# aberto com mmap; colunas texto como códigos (factorize) + valores distintos em UTF-8.
+# O CSV continua sendo o artefato de auditoria; o sidecar só vale enquanto tamanho e mtime
+# do CSV (e, opcionalmente, o sha256) baterem com os registrados em meta.json.
+# NumPy/pandas são importados nas funções: file_sha256 e sidecar_dir servem a comandos leves.
+VERSION = 1
+MMAP_MIN = 1 << 20
+MMAP_WINDOW = 64 << 20  # múltiplo de mmap.ALLOCATIONGRANULARITY
+
+
+def sidecar_dir(csv_path: Path) -> Path:
+    return csv_path.with_name(csv_path.name + '.cols')
+
+
+def _stamp(csv_path: Path) -> dict:
+    st = csv_path.stat()
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def file_sha256(path: Path, bufsize: int = 1 << 20) -> str:
+    # Arquivos grandes via mmap: o hashlib lê as páginas direto (sem cópia para bytes) e
+    # solta o GIL, então vários arquivos podem ser hasheados num pool de threads
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_MIN:
+            try:
+                # Janelas de MMAP_WINDOW bytes: o RSS não cresce com o tamanho do arquivo
+                for off in range(0, size, MMAP_WINDOW):
+                    with mmap.mmap(f.fileno(), min(MMAP_WINDOW, size - off), offset=off, access=mmap.ACCESS_READ) as m:
+                        h.update(m)
+                return h.hexdigest()
+            except (OSError, ValueError):
+                # Sem mmap (sistema de arquivos/arquivo especial): leitura em blocos
+                h = hashlib.sha256()
+                f.seek(0)
+        for buf in iter(lambda: f.read(bufsize), b''):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def write_sidecar(csv_path: Path, df: pd.DataFrame | None = None, sha256: str | None = None) -> Path:
+    # df deve ser exatamente o que pd.read_csv(csv_path) devolveria; por padrão é lido do CSV
+    import numpy as np
+    import pandas as pd
+    if df is None:
+        df = pd.read_csv(csv_path)
+    final = sidecar_dir(csv_path)
+    tmp = final.with_name(final.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    cols = []
+    for i, name in enumerate(df.columns):
+        s = df[name]
+        if s.dtype.kind in 'biuf':
+            np.save(tmp / f'{i}.npy', s.to_numpy())
+            cols.append({'name': name, 'kind': 'num', 'dtype': str(s.dtype)})
+        else:
+            codes, uniques = pd.factorize(s, use_na_sentinel=True)
+            vals = [str(u) for u in uniques]
+            np.save(tmp / f'{i}.codes.npy', codes.astype(np.int32))
+            np.save(tmp / f'{i}.offsets.npy', np.cumsum([0] + [len(v) for v in vals], dtype=np.int64))
+            (tmp / f'{i}.values.txt').write_text(''.join(vals), encoding='utf-8', newline='')
+            cols.append({'name': name, 'kind': 'text', 'dtype': str(s.dtype)})
+    meta = {'version': VERSION, 'rows': len(df), 'columns': cols, 'csv': _stamp(csv_path), 'sha256': sha256}
+    (tmp / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    return final
+
+
+def _valid_meta(csv_path: Path, verify_hash: bool) -> dict | None:
+    meta_file = sidecar_dir(csv_path) / 'meta.json'
+    if not meta_file.exists():
+        return None
+    meta = json.loads(meta_file.read_text(encoding='utf-8'))
+    if meta.get('version') != VERSION or meta.get('csv') != _stamp(csv_path):
+        return None
+    if verify_hash and meta.get('sha256') and meta['sha256'] != file_sha256(csv_path):
+        return None
+    return meta
+
+
+def load_sidecar(csv_path: Path, meta: dict) -> pd.DataFrame:
+    import numpy as np
+    import pandas as pd
+    d = sidecar_dir(csv_path)
+    data = {}
+    for i, c in enumerate(meta['columns']):
+        if c['kind'] == 'num':
+            # Numéricas: memória mapeada, sem cópia nem parsing
+            data[c['name']] = pd.Series(np.load(d / f'{i}.npy', mmap_mode='r'), copy=False)
+        else:
+            codes = np.load(d / f'{i}.codes.npy')
+            offs = np.load(d / f'{i}.offsets.npy').tolist()
+            blob = (d / f'{i}.values.txt').read_text(encoding='utf-8')
+            uniques = np.array([blob[a:b] for a, b in zip(offs[:-1], offs[1:])] + [None], dtype=object)
+            data[c['name']] = pd.Series(uniques[codes], dtype=c['dtype'])
+    return pd.DataFrame(data, copy=False)
+
+
+def read_table(csv_path: Path, verify_hash: bool = False, build: bool = True) -> pd.DataFrame:
+    # Substituto de pd.read_csv: usa o sidecar se estiver em dia, senão lê o CSV e (re)gera o sidecar
+    csv_path = Path(csv_path)
+    meta = _valid_meta(csv_path, verify_hash)
+    if meta is not None:
+        return load_sidecar(csv_path, meta)
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    if build:
+        try:
+            write_sidecar(csv_path, df)
+        except OSError:
+            pass
+    return df
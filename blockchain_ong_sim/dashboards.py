@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import metrics
+from .columnar import read_table
+
+# Dashboards paginados: cada página é um PNG independente (X_p001.png, ...) com todas as
+# linhas distribuídas em páginas de tamanho fixo; X.png continua sendo a primeira página.
+# O manifesto guarda o hash do conteúdo de cada página para re-renderizar só as alteradas.
+W, H = 1400, 900
+ROW_H = 34
+LAYOUT = 1
+MANIFEST = 'dashboards.manifest.json'
+
+EXTRATO = {
+    'name': 'extrato_dashboard', 'title': 'Extrato — Conta ONG (sandbox)', 'color': (34,102,242),
+    'headers': ['date','description','amount','balance','category','counterparty'], 'table_h': H-180,
+}
+CONCILIACAO = {
+    'name': 'conciliacao_dashboard', 'title': 'Conciliação — Ledger x Extrato', 'color': (16,130,90),
+    'headers': ['tx_id_ledger','date','amount','counterparty','match_score','status'], 'table_h': 520,
+}
+
+
+@lru_cache(maxsize=None)
+def fonts():
+    # Carregadas uma vez por processo (cada worker do pool tem o seu cache)
+    try:
+        return ImageFont.truetype('arial.ttf', 32), ImageFont.truetype('arial.ttf', 20)
+    except Exception:
+        return ImageFont.load_default(), ImageFont.load_default()
+
+
+@lru_cache(maxsize=65536)
+def fit_text(text: str, max_w: int) -> str:
+    # Corta com reticências o que não cabe na coluna; medidas memorizadas por processo
+    font = fonts()[1]
+    if font.getlength(text) <= max_w:
+        return text
+    while text and font.getlength(text + '…') > max_w:
+        text = text[:-1]
+    return text + '…'
+
+
+@lru_cache(maxsize=16384)
+def text_mask(text: str, title: bool = False) -> Image.Image:
+    # Texto rasterizado uma vez por processo e colado como máscara (datas, categorias,
+    # status e cabeçalhos se repetem em todas as páginas)
+    font = fonts()[0 if title else 1]
+    _l, _t, r, b = font.getbbox(text)
+    mask = Image.new('L', (max(1, r), max(1, b)), 0)
+    ImageDraw.Draw(mask).text((0, 0), text, fill=255, font=font)
+    return mask
+
+
+def put_text(img, xy, text: str, fill, title: bool = False) -> None:
+    img.paste(fill, (int(xy[0]), int(xy[1])), text_mask(text, title))
+
+
+def rows_per_page(spec: dict) -> int:
+    return int((spec['table_h'] - 40) / ROW_H)
+
+
+def draw_table_image(img, x, y, w, h, headers, rows):
+    d = ImageDraw.Draw(img)
+    d.rectangle([x, y, x+w, y+40], fill=(225,231,240), outline=(180,180,180))
+    col_w = w // len(headers)
+    for i, htxt in enumerate(headers):
+        put_text(img, (x + 10 + i*col_w, y + 10), str(htxt), (20,20,20))
+        d.line([x + (i+1)*col_w, y, x + (i+1)*col_w, y+h], fill=(200,200,200))
+    d.rectangle([x, y, x+w, y+h], outline=(180,180,180))
+    # A paginação garante que rows cabe na tabela
+    for r_i, row in enumerate(rows):
+        ry = y + 40 + r_i*ROW_H
+        if r_i % 2 == 0:
+            d.rectangle([x, ry, x+w, ry+ROW_H], fill=(248,250,252))
+        for c_i, val in enumerate(row[:len(headers)]):
+            put_text(img, (x + 10 + c_i*col_w, ry + 8), fit_text(str(val), col_w - 20), (30,30,30))
+
+
+def render_page(job) -> str:
+    spec, page, pages, rows, summary, out = job
+    img = Image.new('RGB', (W, H), (247,248,250))
+    d = ImageDraw.Draw(img)
+    d.rectangle([0,0,W,70], fill=spec['color'])
+    put_text(img, (20, 18), spec['title'], (255,255,255), title=True)
+    if pages > 1:
+        put_text(img, (W-200, 24), f'Página {page}/{pages}', (255,255,255))
+    draw_table_image(img, 40, 120, W-80, spec['table_h'], spec['headers'], rows)
+    if summary is not None:
+        d.rectangle([40, 670, 500, 830], fill=(255,255,255), outline=(200,200,200))
+        put_text(img, (60, 690), 'Resumo', (0,0,0))
+        put_text(img, (60, 730), summary, (0,0,0))
+    # Compressão rápida: as páginas são muitas e o ganho de tamanho do nível padrão é pequeno
+    img.save(out, compress_level=1)
+    return out
+
+
+def page_path(out_dir: Path, spec: dict, page: int) -> Path:
+    return out_dir / f"{spec['name']}_p{page:03d}.png"
+
+
+def page_jobs(spec: dict, rows: list, summary: str | None, out_dir: Path) -> list[tuple]:
+    per = rows_per_page(spec)
+    pages = max(1, -(-len(rows) // per))
+    return [(spec, p + 1, pages, rows[p*per:(p+1)*per], summary, str(page_path(out_dir, spec, p + 1)))
+            for p in range(pages)]
+
+
+def job_digest(job) -> str:
+    spec, page, pages, rows, summary, _out = job
+    payload = [LAYOUT, spec, page, pages, rows, summary]
+    return hashlib.sha256(json.dumps(payload, default=str, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def render_dashboards(canonical_csv: Path, conc_csv: Path, out_dir: Path,
+                      workers: int | None = None, only_changed: bool = False) -> tuple[Path, ...]:
+    out_dir.mkdir(exist_ok=True)
+    df = read_table(canonical_csv)
+    cdf = read_table(conc_csv)
+    metrics.add_rows(len(df) + len(cdf))
+    matched = (cdf['status']=='matched').mean()*100 if len(cdf) else 0.0
+    jobs_by_spec = [
+        (EXTRATO, page_jobs(EXTRATO, df[EXTRATO['headers']].values.tolist(), None, out_dir)),
+        (CONCILIACAO, page_jobs(CONCILIACAO, cdf[CONCILIACAO['headers']].values.tolist(),
+                                f'Taxa de conciliação: {matched:.1f}%', out_dir)),
+    ]
+    man_path = out_dir / MANIFEST
+    manifest = json.loads(man_path.read_text(encoding='utf-8')) if man_path.exists() else {}
+    todo, new_manifest, outputs = [], {}, []
+    for spec, jobs in jobs_by_spec:
+        for job in jobs:
+            name = Path(job[-1]).name
+            dig = new_manifest[name] = job_digest(job)
+            if not (only_changed and manifest.get(name) == dig and Path(job[-1]).exists()):
+                todo.append(job)
+            outputs.append(Path(job[-1]))
+        # Páginas que sobraram de uma execução maior
+        p = len(jobs) + 1
+        while page_path(out_dir, spec, p).exists():
+            page_path(out_dir, spec, p).unlink()
+            p += 1
+    if workers == 1 or len(todo) <= 2:
+        for job in todo:
+            render_page(job)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_page, todo, chunksize=max(1, len(todo) // 64)))
+    man_path.write_text(json.dumps(new_manifest), encoding='utf-8')
+    # Primeira página também no nome antigo (relatórios e GUI)
+    firsts = []
+    for spec, _jobs in jobs_by_spec:
+        first = out_dir / f"{spec['name']}.png"
+        shutil.copyfile(page_path(out_dir, spec, 1), first)
+        firsts.append(first)
+    print(*firsts, f'({len(outputs)} páginas, {len(todo)} renderizadas)')
+    return tuple(firsts + outputs)
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from pathlib import Path
+
+# Tabela hash em disco (endereçamento aberto, sondagem linear) acessada por mmap: abrir e
+# consultar custam O(1), sem ler o resto do arquivo, e não dependem do backend dbm da
+# plataforma. Chaves de 16 bytes (prefixo de um sha256), valores u64. Cresce dobrando a
+# capacidade quando passa de metade ocupada (rehash amortizado).
+HEADER = struct.Struct('<8sQQQ32s')   # magic, capacidade, ocupados, marca, extra
+SLOT = struct.Struct('<16sQ')          # chave, valor + 1 (0 = vazio)
+MAGIC = b'ONGHTAB1'
+MIN_CAP = 1024
+
+
+def _create(path: Path, cap: int, mark: int = 0, extra: bytes = b'') -> None:
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, cap, 0, mark, extra))
+        f.truncate(HEADER.size + cap * SLOT.size)
+
+
+class DiskHashTable:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists() or self.path.stat().st_size < HEADER.size:
+            _create(self.path, MIN_CAP)
+        self._open()
+
+    def _open(self) -> None:
+        self._f = open(self.path, 'r+b')
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+        magic, self.cap, self.count, self.mark, self.extra = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or len(self._mm) != HEADER.size + self.cap * SLOT.size or self.cap & (self.cap - 1):
+            self.close()
+            raise ValueError(f'{self.path}: not a hash table file')
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self) -> None:
+        HEADER.pack_into(self._mm, 0, MAGIC, self.cap, self.count, self.mark, self.extra)
+
+    def set_mark(self, mark: int, extra: bytes | None = None) -> None:
+        # Marca/extra: progresso de quem alimenta a tabela (ex.: blocos já indexados)
+        self.mark = mark
+        if extra is not None:
+            self.extra = extra.ljust(32, b'\0')[:32]
+        self._write_header()
+
+    def _find(self, key: bytes) -> tuple[int, int]:
+        # (offset do slot, valor + 1); valor 0 = slot vazio onde a chave entraria
+        mask = self.cap - 1
+        i = int.from_bytes(key[:8], 'little') & mask
+        while True:
+            off = HEADER.size + i * SLOT.size
+            k, v = SLOT.unpack_from(self._mm, off)
+            if not v or k == key:
+                return off, v
+            i = (i + 1) & mask
+
+    def get(self, key: bytes) -> int | None:
+        _off, v = self._find(key)
+        return v - 1 if v else None
+
+    def put(self, key: bytes, value: int) -> None:
+        off, v = self._find(key)
+        if not v:
+            if (self.count + 1) * 2 > self.cap:
+                self._grow()
+                off, v = self._find(key)
+            self.count += 1
+            self._write_header()
+        SLOT.pack_into(self._mm, off, key, value + 1)
+
+    def reserve(self, extra: int) -> None:
+        # Antes de um lote de inserções: no máximo um rehash em vez de um por dobra
+        cap = self.cap
+        while (self.count + extra) * 2 > cap:
+            cap *= 2
+        if cap != self.cap:
+            self._grow(cap)
+
+    def _grow(self, cap: int | None = None) -> None:
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        _create(tmp, cap or self.cap * 2, self.mark, self.extra)
+        with DiskHashTable(tmp) as new:
+            for i in range(self.cap):
+                k, v = SLOT.unpack_from(self._mm, HEADER.size + i * SLOT.size)
+                if v:
+                    new.put(k, v - 1)
+        self.close()
+        os.replace(tmp, self.path)
+        self._open()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import hashlib
+
+import numpy as np
+
+from .matching import jaccard, tokenize_all
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+
+def token_hash(tok: str) -> int:
+    # Hash estável entre processos (hash() do Python é aleatorizado)
+    return int.from_bytes(hashlib.blake2b(tok.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHashLSH:
+    # Índice LSH (MinHash + bandas) sobre conjuntos de tokens.
+    # bands x rows = permutações; limiar aproximado de Jaccard ~ (1/bands)**(1/rows):
+    # mais bandas -> mais recall; mais linhas por banda -> mais precisão.
+
+    def __init__(self, bands: int = 16, rows: int = 4, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, self.num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, self.rows, dtype=np.uint64) | np.uint64(1)
+        self._tok_cache = {}
+        self._buckets = [dict() for _ in range(bands)]
+        self._sets = []
+
+    @property
+    def threshold(self) -> float:
+        return (1.0 / self.bands) ** (1.0 / self.rows)
+
+    def _hashes(self, toks) -> np.ndarray:
+        cache = self._tok_cache
+        out = []
+        for t in toks:
+            h = cache.get(t)
+            if h is None:
+                h = cache[t] = token_hash(t)
+            out.append(h)
+        return np.asarray(out, dtype=np.uint64)
+
+    def signatures(self, token_sets: list, chunk: int = 4096) -> np.ndarray:
+        sig = np.full((len(token_sets), self.num_perm), _MERSENNE, dtype=np.uint64)
+        for start in range(0, len(token_sets), chunk):
+            part = token_sets[start:start + chunk]
+            lens = np.fromiter((len(t) for t in part), dtype=np.int64, count=len(part))
+            nonempty = np.flatnonzero(lens)
+            if not len(nonempty):
+                continue
+            x = self._hashes([t for s in part for t in s])
+            # (a*x + b) mod p para todas as permutações de uma vez; mínimo por documento
+            hv = (np.outer(x, self._a) + self._b) % _MERSENNE
+            offsets = np.concatenate([[0], np.cumsum(lens)[:-1]])
+            sig[start + nonempty] = np.minimum.reduceat(hv, offsets[nonempty], axis=0)
+        return sig
+
+    def _band_keys(self, sig: np.ndarray) -> np.ndarray:
+        bands = sig.reshape(len(sig), self.bands, self.rows)
+        return (bands * self._band_mix).sum(axis=2)  # aritmética uint64 modular
+
+    def add(self, token_sets: list) -> None:
+        base = len(self._sets)
+        self._sets.extend(token_sets)
+        keys = self._band_keys(self.signatures(token_sets))
+        for b, bucket in enumerate(self._buckets):
+            for i, k in enumerate(keys[:, b].tolist(), start=base):
+                bucket.setdefault(k, []).append(i)
+
+    def candidates(self, token_sets: list) -> list[set]:
+        keys = self._band_keys(self.signatures(token_sets))
+        out = []
+        for row in keys.tolist():
+            cand = set()
+            for b, k in enumerate(row):
+                hit = self._buckets[b].get(k)
+                if hit:
+                    cand.update(hit)
+            out.append(cand)
+        return out
+
+    def query(self, token_sets: list, min_sim: float = 0.5, top_k: int = 3) -> list[list[tuple[int, float]]]:
+        # Candidatos LSH confirmados pelo Jaccard exato
+        out = []
+        for toks, cand in zip(token_sets, self.candidates(token_sets)):
+            scored = [(j, jaccard(toks, self._sets[j])) for j in cand]
+            scored = [c for c in scored if c[1] >= min_sim]
+            scored.sort(key=lambda c: (-c[1], c[0]))
+            out.append(scored[:top_k])
+        return out
+
+
+FUZZY_FIELDS = ['ext_row', 'date', 'amount', 'description', 'tx_id_ledger', 'ledger_date',
+                'ledger_amount', 'ledger_description', 'amount_delta', 'desc_sim']
+
+
+def fuzzy_proposals(ext, led, conc: list[dict], bands=16, rows=4, min_sim=0.5, top_k=3) -> list[dict]:
+    # Sugestões por descrição para as linhas que ficaram 'unmatched'
+    open_rows = [i for i, c in enumerate(conc) if c['status'] == 'unmatched']
+    if not open_rows or not len(led):
+        return []
+    index = MinHashLSH(bands=bands, rows=rows)
+    index.add(tokenize_all(led['description'].tolist()))
+    e_desc = ext['description'].tolist()
+    hits = index.query(tokenize_all([e_desc[i] for i in open_rows]), min_sim=min_sim, top_k=top_k)
+    l_ids = led['tx_id'].tolist(); l_dates = led['date'].tolist()
+    l_amts = led['amount'].tolist(); l_desc = led['description'].tolist()
+    out = []
+    for i, cand in zip(open_rows, hits):
+        e_amt = float(ext['amount'].iat[i])
+        for j, sim in cand:
+            out.append({
+                'ext_row': i, 'date': ext['date'].iat[i], 'amount': e_amt, 'description': e_desc[i],
+                'tx_id_ledger': l_ids[j], 'ledger_date': l_dates[j], 'ledger_amount': float(l_amts[j]),
+                'ledger_description': l_desc[j], 'amount_delta': round(float(l_amts[j]) - e_amt, 2),
+                'desc_sim': round(sim, 4),
+            })
+    return out
@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .hashtable import DiskHashTable
+
+CONC_FIELDS = ['tx_id_ledger', 'date', 'amount', 'counterparty', 'match_score', 'status']
+
+
+def token_set(s: str):
+    return {t.lower() for t in str(s).replace('-', ' ').replace('/', ' ').split() if t}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    inter = len(a & b)
+    union = len(a | b) or 1
+    return inter / union
+
+
+def tokenize_all(descriptions) -> list:
+    # Cada descrição distinta é tokenizada uma única vez
+    cache = {}
+    out = []
+    for s in descriptions:
+        toks = cache.get(s)
+        if toks is None:
+            toks = cache[s] = frozenset(token_set(s))
+        out.append(toks)
+    return out
+
+
+def to_cents(amounts) -> tuple[np.ndarray, np.ndarray]:
+    a = np.asarray(amounts, dtype=float)
+    valid = np.isfinite(a)
+    cents = np.zeros(len(a), dtype=np.int64)
+    cents[valid] = np.rint(a[valid] * 100).astype(np.int64)
+    return cents, valid
+
+
+def to_days(dates) -> np.ndarray:
+    d = pd.to_datetime(pd.Series(dates).astype(str), format='%Y-%m-%d')
+    return d.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def prepare(df: pd.DataFrame) -> dict:
+    cents, valid = to_cents(df['amount'])
+    return {
+        'cents': cents,
+        'valid': valid,
+        'days': to_days(df['date']),
+        'tokens': tokenize_all(df['description'].tolist()),
+    }
+
+
+def exact_candidates(ext: dict, led: dict, window: int) -> tuple[np.ndarray, np.ndarray]:
+    # Hash-join: índice do ledger por (centavos, bucket de data); buckets de largura
+    # window+1 garantem que qualquer par dentro da janela está em buckets vizinhos.
+    empty = np.zeros(0, dtype=np.int64)
+    if window < 0 or not len(ext['cents']) or not len(led['cents']):
+        return empty, empty
+    width = int(window) + 1
+    l_pos = np.flatnonzero(led['valid'])
+    index = pd.DataFrame({
+        'l': l_pos,
+        'cents': led['cents'][l_pos],
+        'bucket': led['days'][l_pos] // width,
+    })
+    e_pos = np.flatnonzero(ext['valid'])
+    e_bucket = ext['days'][e_pos] // width
+    probe = pd.DataFrame({
+        'e': np.tile(e_pos, 3),
+        'cents': np.tile(ext['cents'][e_pos], 3),
+        'bucket': np.concatenate([e_bucket - 1, e_bucket, e_bucket + 1]),
+    })
+    pairs = probe.merge(index, on=['cents', 'bucket'], how='inner')
+    e = pairs['e'].to_numpy(dtype=np.int64)
+    l = pairs['l'].to_numpy(dtype=np.int64)
+    keep = np.abs(led['days'][l] - ext['days'][e]) <= window
+    return e[keep], l[keep]
+
+
+def tolerance_cents(e_cents: np.ndarray, amount_tol=0.0, amount_tol_pct=0.0) -> np.ndarray:
+    # Tolerância por linha: o maior entre o absoluto e o percentual do valor
+    return np.maximum(float(amount_tol) * 100, np.abs(e_cents) * float(amount_tol_pct) / 100)
+
+
+def sweep_candidates(ext: dict, led: dict, window: int, amount_tol=0.0, amount_tol_pct=0.0,
+                     max_pairs: int = 2_000_000) -> tuple[np.ndarray, np.ndarray]:
+    # Ambos os lados ordenados por (valor, data); cada linha do extrato faz bisect da faixa
+    # [valor - tol, valor + tol] no ledger. Os pares são expandidos em blocos de no máximo
+    # ~max_pairs para manter a memória limitada.
+    empty = np.zeros(0, dtype=np.int64)
+    if window < 0 or not len(ext['cents']) or not len(led['cents']):
+        return empty, empty
+    l_pos = np.flatnonzero(led['valid'])
+    l_sorted = l_pos[np.lexsort((led['days'][l_pos], led['cents'][l_pos]))]
+    l_cents = led['cents'][l_sorted]
+    e_pos = np.flatnonzero(ext['valid'])
+    e_sorted = e_pos[np.lexsort((ext['days'][e_pos], ext['cents'][e_pos]))]
+    e_cents = ext['cents'][e_sorted]
+    tol = np.floor(tolerance_cents(e_cents, amount_tol, amount_tol_pct) + 1e-9).astype(np.int64)
+    lo = np.searchsorted(l_cents, e_cents - tol, side='left')
+    hi = np.searchsorted(l_cents, e_cents + tol, side='right')
+    counts = hi - lo
+    es, ls = [], []
+    start = 0
+    cum = np.cumsum(counts)
+    while start < len(counts):
+        done = cum[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cum, done + max_pairs, side='right')), start + 1)
+        c = counts[start:stop]
+        total = int(c.sum())
+        if total:
+            e = np.repeat(e_sorted[start:stop], c)
+            offs = np.arange(total) - np.repeat(np.cumsum(c) - c, c)
+            l = l_sorted[np.repeat(lo[start:stop], c) + offs]
+            keep = np.abs(led['days'][l] - ext['days'][e]) <= window
+            es.append(e[keep]); ls.append(l[keep])
+        start = stop
+    if not es:
+        return empty, empty
+    return np.concatenate(es), np.concatenate(ls)
+
+
+def candidate_pairs(ext: dict, led: dict, window: int, amount_tol=0.0, amount_tol_pct=0.0):
+    if amount_tol > 0 or amount_tol_pct > 0:
+        return sweep_candidates(ext, led, window, amount_tol, amount_tol_pct)
+    return exact_candidates(ext, led, window)
+
+
+def score_pairs(e: np.ndarray, l: np.ndarray, ext: dict, led: dict, amount_tol=0.0, amount_tol_pct=0.0):
+    sims = np.fromiter((jaccard(ext['tokens'][i], led['tokens'][j]) for i, j in zip(e.tolist(), l.tolist())),
+                       dtype=float, count=len(e))
+    # Similaridade de valor: 1.0 no valor exato, caindo linearmente até 0 na borda da tolerância
+    tol = tolerance_cents(ext['cents'][e], amount_tol, amount_tol_pct)
+    dev = np.abs(led['cents'][l] - ext['cents'][e]).astype(float)
+    amt_sim = np.clip(1.0 - dev / np.where(tol > 0, tol, 1.0), 0.0, 1.0)
+    amt_sim[tol <= 0] = 1.0
+    scores = 0.5*amt_sim + 0.3*1.0 + 0.2*sims
+    return sims, scores
+
+
+def rank_pairs(e: np.ndarray, l: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    # Ordem: linha do extrato, maior score, empate pela ordem do ledger
+    return np.lexsort((l, -scores, e))
+
+
+def pick_best(e: np.ndarray, l: np.ndarray, sims: np.ndarray, scores: np.ndarray):
+    order = rank_pairs(e, l, scores)
+    e, l, sims, scores = e[order], l[order], sims[order], scores[order]
+    first = np.ones(len(e), dtype=bool)
+    first[1:] = e[1:] != e[:-1]
+    return e[first], l[first], sims[first], scores[first]
+
+
+def build_rows(ext: pd.DataFrame, led: pd.DataFrame, best_e, best_l, best_sim, best_score, desc_thresh: float) -> list[dict]:
+    tx_ids = led['tx_id'].tolist()
+    dates = ext['date'].tolist()
+    amounts = ext['amount'].tolist()
+    cps = ext['counterparty'].tolist()
+    best = dict(zip(best_e.tolist(), zip(best_l.tolist(), best_sim.tolist(), best_score.tolist())))
+    conc = []
+    for i in range(len(ext)):
+        hit = best.get(i)
+        if hit is None:
+            conc.append({
+                'tx_id_ledger': '', 'date': dates[i], 'amount': float(amounts[i]),
+                'counterparty': str(cps[i]), 'match_score': 0.0, 'status': 'unmatched',
+            })
+            continue
+        j, d_sim, score = hit
+        status = 'matched' if score >= 0.85 and d_sim >= desc_thresh else ('manual_review' if score >= 0.6 else 'unmatched')
+        conc.append({
+            'tx_id_ledger': tx_ids[j], 'date': dates[i], 'amount': float(amounts[i]),
+            'counterparty': str(cps[i]), 'match_score': round(score, 2), 'status': status,
+        })
+    return conc
+
+
+def _scored_pairs(ext: pd.DataFrame, led: pd.DataFrame, date_window_days, amount_tol, amount_tol_pct):
+    pe, pl = prepare(ext), prepare(led)
+    e, l = candidate_pairs(pe, pl, date_window_days, amount_tol, amount_tol_pct)
+    sims, scores = score_pairs(e, l, pe, pl, amount_tol, amount_tol_pct)
+    return e, l, sims, scores
+
+
+def match_frames(ext: pd.DataFrame, led: pd.DataFrame, date_window_days=1, desc_thresh=0.4,
+                 amount_tol=0.0, amount_tol_pct=0.0) -> list[dict]:
+    best = pick_best(*_scored_pairs(ext, led, date_window_days, amount_tol, amount_tol_pct))
+    return build_rows(ext, led, *best, desc_thresh)
+
+
+CANDIDATE_FIELDS = ['ext_row', 'rank', 'tx_id_ledger', 'ledger_date', 'ledger_amount', 'amount_delta',
+                    'desc_sim', 'match_score']
+
+
+def ranked_candidates(ext: pd.DataFrame, led: pd.DataFrame, date_window_days=1, amount_tol=0.0,
+                      amount_tol_pct=0.0, top_k=3) -> list[dict]:
+    # Top-k candidatos por linha do extrato, na mesma ordem usada para escolher o match
+    e, l, sims, scores = _scored_pairs(ext, led, date_window_days, amount_tol, amount_tol_pct)
+    order = rank_pairs(e, l, scores)
+    e, l, sims, scores = e[order], l[order], sims[order], scores[order]
+    starts = np.ones(len(e), dtype=bool)
+    starts[1:] = e[1:] != e[:-1]
+    rank = np.arange(len(e)) - np.maximum.accumulate(np.where(starts, np.arange(len(e)), 0))
+    keep = rank < top_k
+    tx_ids = led['tx_id'].tolist(); l_dates = led['date'].tolist(); l_amts = led['amount'].tolist()
+    e_amts = ext['amount'].tolist()
+    out = []
+    for i, r, j, sim, sc in zip(e[keep].tolist(), rank[keep].tolist(), l[keep].tolist(),
+                                sims[keep].tolist(), scores[keep].tolist()):
+        out.append({
+            'ext_row': i, 'rank': r + 1, 'tx_id_ledger': tx_ids[j], 'ledger_date': l_dates[j],
+            'ledger_amount': float(l_amts[j]), 'amount_delta': round(float(l_amts[j]) - float(e_amts[i]), 2),
+            'desc_sim': round(sim, 4), 'match_score': round(sc, 2),
+        })
+    return out
+
+
+def shard_ranges(days: np.ndarray, shards: int) -> list[tuple[int, int]]:
+    # Fatias contíguas de datas (intervalo semiaberto [lo, hi)) com ~o mesmo número de linhas
+    if not len(days):
+        return []
+    s = np.sort(days)
+    cuts = np.unique(s[[len(s) * k // shards for k in range(1, shards)]]) if shards > 1 else np.zeros(0, dtype=s.dtype)
+    edges = [int(s[0])] + [int(c) for c in cuts if c > s[0]] + [int(s[-1]) + 1]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _match_shard(job):
+    ext, led, date_window_days, amount_tol, amount_tol_pct = job
+    best_e, best_l, best_sim, best_score = pick_best(*_scored_pairs(ext, led, date_window_days, amount_tol, amount_tol_pct))
+    # Posições locais -> posições globais (a ordem relativa do ledger é preservada)
+    return ext.index.to_numpy()[best_e], led.index.to_numpy()[best_l], best_sim, best_score
+
+
+def match_frames_parallel(ext: pd.DataFrame, led: pd.DataFrame, date_window_days=1, desc_thresh=0.4, workers=2,
+                          amount_tol=0.0, amount_tol_pct=0.0) -> list[dict]:
+    from concurrent.futures import ProcessPoolExecutor
+    ext = ext.reset_index(drop=True)
+    led = led.reset_index(drop=True)
+    e_days = to_days(ext['date'])
+    l_days = to_days(led['date'])
+    w = max(int(date_window_days), 0)
+    jobs = []
+    for lo, hi in shard_ranges(e_days, workers):
+        # Ledger com sobreposição igual à janela de datas: nenhum candidato se perde na borda
+        jobs.append((
+            ext[(e_days >= lo) & (e_days < hi)],
+            led[(l_days >= lo - w) & (l_days < hi + w)],
+            date_window_days, amount_tol, amount_tol_pct,
+        ))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_match_shard, jobs))
+    if parts:
+        best_e = np.concatenate([p[0] for p in parts])
+        best_l = np.concatenate([p[1] for p in parts])
+        best_sim = np.concatenate([p[2] for p in parts])
+        best_score = np.concatenate([p[3] for p in parts])
+    else:
+        best_e = best_l = np.zeros(0, dtype=np.int64); best_sim = best_score = np.zeros(0)
+    return build_rows(ext, led, best_e, best_l, best_sim, best_score, desc_thresh)
+
+
+STATE_MATCHED = 'reconcile_state.matched.jsonl'
+STATE_OPEN = 'reconcile_state.open.json'
+STATE_KEYS = 'reconcile_state.keys'
+LEDGER_COLS = ['tx_id', 'date', 'amount', 'description', 'counterparty']
+
+
+def row_keys(df: pd.DataFrame, salt: str = '') -> list[str]:
+    # Chave estável por linha (hash do conteúdo canônico); linhas idênticas recebem sufixo de
+    # ocorrência. salt separa os espaços de chaves (ex.: 'ledger|' para lançamentos do ledger).
+    seen = {}
+    keys = []
+    for d, a, desc, cp in zip(df['date'].tolist(), df['amount'].tolist(),
+                              df['description'].tolist(), df['counterparty'].tolist()):
+        base = f'{d}|{float(a)!r}|{desc}|{cp}'
+        k = seen.get(base, 0)
+        seen[base] = k + 1
+        keys.append(hashlib.sha256(f'{salt}{base}#{k}'.encode('utf-8')).hexdigest()[:32])
+    return keys
+
+
+def _key_table(state_dir: Path) -> DiskHashTable:
+    # ext_key/led_key -> offset do registro no journal de pares; a marca é quantos bytes do
+    # journal já estão indexados, então só o trecho novo é lido (um journal de versão
+    # anterior é indexado uma vez). Registro parcial no fim (queda) fica de fora.
+    state_dir.mkdir(parents=True, exist_ok=True)
+    path = state_dir / STATE_KEYS
+    try:
+        tab = DiskHashTable(path)
+    except ValueError:
+        path.unlink()
+        tab = DiskHashTable(path)
+    journal = state_dir / STATE_MATCHED
+    size = journal.stat().st_size if journal.exists() else 0
+    if tab.mark > size:
+        tab.close()
+        path.unlink()
+        tab = DiskHashTable(path)
+    if tab.mark < size:
+        off = tab.mark
+        with journal.open('rb') as f:
+            f.seek(off)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                rec = json.loads(line)
+                tab.put(bytes.fromhex(rec['ext_key']), off)
+                if rec.get('led_key'):
+                    tab.put(bytes.fromhex(rec['led_key']), off)
+                off += len(line)
+        tab.set_mark(off)
+    return tab
+
+
+def load_open(state_dir: Path) -> tuple[dict[str, dict], dict[str, dict], dict]:
+    # Itens em aberto (extrato e ledger) por chave; formato antigo (tx_ids soltos) é ignorado
+    path = state_dir / STATE_OPEN
+    state = {}
+    if path.exists():
+        try:
+            state = json.loads(path.read_text(encoding='utf-8'))
+        except ValueError:
+            pass
+    ext = {r['ext_key']: r for r in state.get('open_extract') or [] if isinstance(r, dict) and 'ext_key' in r}
+    led = {r['led_key']: r for r in state.get('open_ledger') or [] if isinstance(r, dict) and 'led_key' in r}
+    return ext, led, state
+
+
+def match_incremental(ext: pd.DataFrame, led: pd.DataFrame, state_dir: Path, date_window_days=1,
+                      desc_thresh=0.4, workers=1, amount_tol=0.0, amount_tol_pct=0.0) -> list[dict]:
+    # Linhas do extrato e lançamentos do ledger são identificados pelo hash da linha
+    # canônica (row_keys), não pelo arquivo nem pelo tx_id (que se repete entre ledgers):
+    # extratos/ledgers novos que repetem linhas reaproveitam o estado. Só as linhas do
+    # extrato sem par são conciliadas, contra os lançamentos em aberto de execuções
+    # anteriores (open set) mais os do ledger atual ainda não consumidos. "Já conciliado?"
+    # é uma sondagem na tabela de chaves: o custo segue o delta, não o histórico.
+    journal = state_dir / STATE_MATCHED
+    with _key_table(state_dir) as tab:
+        keys = row_keys(ext)
+        done = [tab.get(bytes.fromhex(k)) for k in keys]
+        delta = [i for i, off in enumerate(done) if off is None]
+        open_ext, open_led, prior = load_open(state_dir)
+        led_keys = row_keys(led, 'ledger|')
+        fresh = [j for j, k in enumerate(led_keys) if k not in open_led and tab.get(bytes.fromhex(k)) is None]
+        # Candidatos com tx_id = chave (única) durante a conciliação; o tx_id real volta depois
+        cand = pd.concat([
+            pd.DataFrame([{**r, 'tx_id': r['led_key']} for r in open_led.values()], columns=LEDGER_COLS),
+            led.iloc[fresh][LEDGER_COLS].assign(tx_id=[led_keys[j] for j in fresh]),
+        ], ignore_index=True)
+        real = {r['led_key']: r['tx_id'] for r in open_led.values()}
+        tx_ids = led['tx_id'].astype(str).tolist()
+        real.update((led_keys[j], tx_ids[j]) for j in fresh)
+        ext_delta = ext.iloc[delta].reset_index(drop=True)
+        if workers and workers > 1:
+            rows = match_frames_parallel(ext_delta, cand, date_window_days, desc_thresh, workers,
+                                         amount_tol, amount_tol_pct)
+        else:
+            rows = match_frames(ext_delta, cand, date_window_days, desc_thresh, amount_tol, amount_tol_pct)
+        used = set()
+        new = []
+        for i, r in zip(delta, rows):
+            lk = r['tx_id_ledger']
+            if lk:
+                r['tx_id_ledger'] = real[lk]
+            if r['status'] != 'matched':
+                continue
+            if lk in used:
+                # Um lançamento do ledger só concilia uma linha do extrato
+                r['status'] = 'manual_review'
+                continue
+            used.add(lk)
+            new.append({'ext_key': keys[i], 'led_key': lk, 'tx_id_ledger': r['tx_id_ledger'],
+                        'match_score': r['match_score'], 'status': r['status'],
+                        'date': r['date'], 'amount': r['amount']})
+        conc = []
+        it = iter(rows)
+        dates, amounts, cps = ext['date'].tolist(), ext['amount'].tolist(), ext['counterparty'].tolist()
+        with journal.open('rb') if journal.exists() else contextlib.nullcontext() as f:
+            for i, off in enumerate(done):
+                if off is None:
+                    conc.append(next(it))
+                    continue
+                f.seek(off)
+                rec = json.loads(f.readline())
+                conc.append({
+                    'tx_id_ledger': rec['tx_id_ledger'], 'date': dates[i], 'amount': float(amounts[i]),
+                    'counterparty': str(cps[i]), 'match_score': rec['match_score'], 'status': rec['status'],
+                })
+        if new:
+            # Journal primeiro, tabela depois: se cair no meio, _key_table reindexa o trecho
+            off = tab.mark
+            lines = [(json.dumps(rec, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8') for rec in new]
+            with journal.open('ab') as f:
+                f.truncate(off)
+                f.write(b''.join(lines))
+            tab.reserve(2 * len(new))
+            for rec, line in zip(new, lines):
+                tab.put(bytes.fromhex(rec['ext_key']), off)
+                tab.put(bytes.fromhex(rec['led_key']), off)
+                off += len(line)
+            tab.set_mark(off)
+    descs = ext['description'].tolist()
+    for rec in new:
+        open_ext.pop(rec['ext_key'], None)
+    for i, r in zip(delta, rows):
+        if r['status'] != 'matched':
+            open_ext[keys[i]] = {'ext_key': keys[i], 'date': dates[i], 'amount': float(amounts[i]),
+                                 'description': str(descs[i]), 'counterparty': str(cps[i])}
+    open_led = [{'led_key': k, 'tx_id': real[k], 'date': d, 'amount': float(a), 'description': str(ds),
+                 'counterparty': str(cp)}
+                for k, d, a, ds, cp in zip(cand['tx_id'].tolist(), cand['date'].tolist(), cand['amount'].tolist(),
+                                           cand['description'].tolist(), cand['counterparty'].tolist())
+                if k not in used]
+    tmp = state_dir / (STATE_OPEN + '.tmp')
+    tmp.write_text(json.dumps({
+        'updated': datetime.utcnow().isoformat()+'Z',
+        'matched_total': int(prior.get('matched_total') or 0) + len(new),
+        'processed_rows': len(delta),
+        'open_extract': list(open_ext.values()),
+        'open_ledger': open_led,
+    }, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(tmp, state_dir / STATE_OPEN)
+    return conc
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+# Diário de âncoras pendentes: um único arquivo append-only, uma transação JSON compacta
+# por linha (exatamente os bytes da folha Merkle + '\n'). Selar um bloco = uma leitura
+# sequencial do prefixo + um truncate (tudo consumido) ou rotate (sobra reescrita).
+# Gravações e o rotate acontecem sob um lock de arquivo (<diário>.lock), reentrante no
+# processo: o rotate preserva tudo o que foi acrescentado depois do take(), mesmo vindo de
+# outro processo (ex.: mine --continuous junto com canonicalize/anchor-files).
+
+
+@dataclass
+class BlockPolicy:
+    # Um bloco leva no máximo max_txs transações e max_bytes bytes de transações (sempre
+    # ao menos uma); em modo contínuo sela quando um limite enche ou a âncora mais antiga
+    # espera max_wait segundos.
+    max_txs: int = 1000
+    max_bytes: int = 1_000_000
+    max_wait: float = 60.0
+
+    def due(self, count: int, nbytes: int, oldest_age: float | None) -> bool:
+        if not count:
+            return False
+        return (count >= self.max_txs or nbytes >= self.max_bytes
+                or (oldest_age is not None and oldest_age >= self.max_wait))
+
+
+def _age(tx_line: bytes) -> float | None:
+    try:
+        ts = json.loads(tx_line)['timestamp'].rstrip('Z')
+        return (datetime.utcnow() - datetime.fromisoformat(ts)).total_seconds()
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+# caminho -> [RLock, profundidade, arquivo de lock aberto]
+_locks: dict[str, list] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_file(f) -> None:
+    if os.name == 'nt':
+        import msvcrt
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+    import fcntl
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    key = str(Path(path).resolve())
+    with _locks_guard:
+        entry = _locks.setdefault(key, [threading.RLock(), 0, None])
+    with entry[0]:
+        if not entry[1]:
+            f = open(key + '.lock', 'a+b')
+            _lock_file(f)
+            entry[2] = f
+        entry[1] += 1
+        try:
+            yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                # Fechar o arquivo libera o lock
+                entry[2].close()
+                entry[2] = None
+
+
+class AnchorJournal:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def locked(self):
+        return file_lock(self.path)
+
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, tx_bytes: bytes) -> None:
+        with self.locked(), self.path.open('ab') as f:
+            f.write(tx_bytes + b'\n')
+
+    def extend(self, txs: list[bytes]) -> None:
+        # Lote de âncoras num único write
+        with self.locked(), self.path.open('ab') as f:
+            f.write(b''.join(tx + b'\n' for tx in txs))
+
+    def lines(self) -> list[bytes]:
+        if not self.path.exists():
+            return []
+        return [ln for ln in self.path.read_bytes().split(b'\n') if ln]
+
+    def stats(self) -> tuple[int, int, float | None]:
+        # (pendentes, bytes, idade da mais antiga em segundos)
+        lines = self.lines()
+        return len(lines), sum(len(ln) for ln in lines), _age(lines[0]) if lines else None
+
+    def take(self, policy: BlockPolicy | None = None) -> tuple[list[bytes], list[bytes], int]:
+        # Prefixo que cabe no bloco (tudo, sem política), o restante e o offset do fim do
+        # prefixo no arquivo (para o rotate), numa leitura só
+        with self.locked():
+            data = self.path.read_bytes() if self.path.exists() else b''
+        taken, nbytes, end = [], 0, 0
+        while end < len(data):
+            nl = data.find(b'\n', end)
+            stop = len(data) if nl < 0 else nl + 1
+            ln = data[end:stop].rstrip(b'\n')
+            if ln and policy is not None and taken and (len(taken) >= policy.max_txs or nbytes + len(ln) > policy.max_bytes):
+                break
+            if ln:
+                taken.append(ln)
+                nbytes += len(ln)
+            end = stop
+        rest = [ln for ln in data[end:].split(b'\n') if ln]
+        return taken, rest, end
+
+    def rotate(self, end: int) -> None:
+        # Descarta os primeiros end bytes (o que o take() consumiu); o resto do arquivo,
+        # inclusive o que foi acrescentado depois do take(), é preservado
+        with self.locked():
+            if not self.path.exists():
+                return
+            if self.size() <= end:
+                with self.path.open('r+b') as f:
+                    f.truncate(0)
+                return
+            tmp = self.path.with_suffix('.tmp')
+            with self.path.open('rb') as src, tmp.open('wb') as dst:
+                src.seek(end)
+                while chunk := src.read(1 << 20):
+                    dst.write(chunk)
+            os.replace(tmp, self.path)
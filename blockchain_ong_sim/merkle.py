@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+from pathlib import Path
+
+# Arquivo de níveis: MAGIC + n (u64) + digests de cada nível, folhas primeiro, sem o nó
+# duplicado de padding. O tamanho de cada nível é ceil(n / 2**L), então o offset de
+# qualquer nó é calculável e a prova sai com O(log n) leituras.
+MAGIC = b'MRK1'
+HEAD = struct.Struct('<4sQ')
+
+
+def _h(b: bytes) -> bytes:
+    return hashlib.sha256(b).digest()
+
+
+def level_sizes(n: int) -> list[int]:
+    sizes = [n]
+    while sizes[-1] > 1:
+        sizes.append((sizes[-1] + 1) // 2)
+    return sizes
+
+
+class MerkleTree:
+    # Mesma regra de merkle_root: folhas sha256(tx), nível ímpar duplica o último nó
+
+    def __init__(self, items: list[bytes] | None = None, levels: list[list[bytes]] | None = None):
+        if levels is None:
+            layer = [_h(x) for x in (items or [])]
+            levels = [layer]
+            while len(layer) > 1:
+                padded = layer + [layer[-1]] if len(layer) % 2 == 1 else layer
+                layer = [_h(padded[i] + padded[i+1]) for i in range(0, len(padded), 2)]
+                levels.append(layer)
+        self.levels = levels
+
+    def __len__(self) -> int:
+        return len(self.levels[0])
+
+    @property
+    def root(self) -> str:
+        if not self.levels[0]:
+            return hashlib.sha256(b'').hexdigest()
+        return self.levels[-1][0].hex()
+
+    def proof(self, index: int) -> list[dict]:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        out = []
+        for layer in self.levels[:-1]:
+            sib = index ^ 1
+            node = layer[sib] if sib < len(layer) else layer[index]
+            out.append({'hash': node.hex(), 'side': 'right' if index % 2 == 0 else 'left'})
+            index //= 2
+        return out
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix('.tmp')
+        with tmp.open('wb') as f:
+            f.write(HEAD.pack(MAGIC, len(self)))
+            for layer in self.levels:
+                f.write(b''.join(layer))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'MerkleTree':
+        raw = path.read_bytes()
+        magic, n = HEAD.unpack_from(raw, 0)
+        if magic != MAGIC:
+            raise ValueError(f'not a merkle levels file: {path}')
+        levels, pos = [], HEAD.size
+        for size in level_sizes(n):
+            levels.append([raw[pos + 32*i:pos + 32*(i+1)] for i in range(size)])
+            pos += 32 * size
+        return cls(levels=levels)
+
+
+def proof_from_file(path: Path, index: int) -> tuple[str, list[dict]]:
+    # Lê só os irmãos do caminho (um seek por nível) e devolve (raiz, prova)
+    with path.open('rb') as f:
+        magic, n = HEAD.unpack(f.read(HEAD.size))
+        if magic != MAGIC:
+            raise ValueError(f'not a merkle levels file: {path}')
+        if not 0 <= index < n:
+            raise IndexError(index)
+        sizes = level_sizes(n)
+        base = HEAD.size
+        out = []
+        for size in sizes[:-1]:
+            sib = index ^ 1
+            f.seek(base + 32 * (sib if sib < size else index))
+            out.append({'hash': f.read(32).hex(), 'side': 'right' if index % 2 == 0 else 'left'})
+            base += 32 * size
+            index //= 2
+        f.seek(base)
+        root = f.read(32).hex()
+    return root, out
+
+
+def verify(leaf: bytes, proof: list[dict], root: str, _memo: dict | None = None) -> bool:
+    node = _h(leaf)
+    for step in proof:
+        sib = bytes.fromhex(step['hash'])
+        pair = (node + sib) if step['side'] == 'right' else (sib + node)
+        if _memo is None:
+            node = _h(pair)
+        else:
+            node = _memo.get(pair)
+            if node is None:
+                node = _memo[pair] = _h(pair)
+    return node.hex() == root
+
+
+def verify_batch(items: list[tuple[bytes, list[dict]]], root: str) -> list[bool]:
+    # Várias provas contra o mesmo bloco: nós internos compartilhados são hasheados uma vez
+    memo = {}
+    return [verify(leaf, proof, root, memo) for leaf, proof in items]
+
+
+class MerkleFrontier:
+    # Acumulador incremental (fronteira de subárvores perfeitas, como numa Merkle mountain
+    # range): O(log n) de memória e O(1) hashes amortizados por folha. root() aplica a mesma
+    # regra de padding (duplicar o último nó de nível ímpar), então coincide com
+    # MerkleTree(items).root para qualquer n.
+    RULE = 'dup-last-v1'
+
+    def __init__(self, count: int = 0, peaks: list[bytes | None] | None = None):
+        self.count = count
+        self.peaks = peaks or []
+
+    def append(self, item: bytes) -> None:
+        node = _h(item)
+        level = 0
+        while level < len(self.peaks) and self.peaks[level] is not None:
+            node = _h(self.peaks[level] + node)
+            self.peaks[level] = None
+            level += 1
+        if level == len(self.peaks):
+            self.peaks.append(node)
+        else:
+            self.peaks[level] = node
+        self.count += 1
+
+    def root(self) -> str:
+        n = self.count
+        if not n:
+            return hashlib.sha256(b'').hexdigest()
+        top = (n - 1).bit_length()
+        lowest = (n & -n).bit_length() - 1
+        node = self.peaks[lowest]
+        for level in range(lowest, top):
+            # Nível com contagem par: o irmão à esquerda é o pico; ímpar: duplica o nó
+            if level != lowest and (n >> level) & 1:
+                node = _h(self.peaks[level] + node)
+            else:
+                node = _h(node + node)
+        return node.hex()
+
+    def to_dict(self) -> dict:
+        return {'rule': self.RULE, 'count': self.count,
+                'peaks': [p.hex() if p is not None else None for p in self.peaks]}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'MerkleFrontier':
+        if d.get('rule') != cls.RULE:
+            raise ValueError(f"unsupported frontier rule: {d.get('rule')}")
+        return cls(d['count'], [bytes.fromhex(p) if p is not None else None for p in d['peaks']])
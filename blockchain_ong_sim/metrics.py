@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Instrumentação por estágio (--metrics / --profile da CLI). Desligada, cada estágio
+# decorado custa uma checagem de global e add_rows() é um retorno imediato.
+_recorder: Recorder | None = None
+
+
+def _io_counters() -> tuple[int | None, int | None]:
+    # Bytes lidos/escritos pelo processo (Linux: /proc/self/io; senão psutil, se houver)
+    try:
+        with open('/proc/self/io', 'rb') as f:
+            vals = dict(line.split(b':') for line in f.read().splitlines())
+        return int(vals[b'rchar']), int(vals[b'wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        c = psutil.Process().io_counters()
+        return c.read_bytes, c.write_bytes
+    except Exception:
+        return None, None
+
+
+def _peak_rss() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except Exception:
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Recorder:
+
+    def __init__(self, path: Path | None, profile_dir: Path | None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.records = []
+        self._stack = threading.local()
+        self._lock = threading.Lock()
+        self._profiling = False
+        if profile_dir is not None:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+
+    def _frames(self) -> list:
+        if not hasattr(self._stack, 'frames'):
+            self._stack.frames = []
+        return self._stack.frames
+
+    def run(self, name: str, fn, args, kwargs):
+        frame = {'rows': None}
+        self._frames().append(frame)
+        prof = None
+        with self._lock:
+            # cProfile não aninha: só um estágio perfilado por vez
+            if self.profile_dir is not None and not self._profiling:
+                import cProfile
+                prof = cProfile.Profile()
+                self._profiling = True
+        r0, w0 = _io_counters()
+        t0 = time.perf_counter()
+        if prof is not None:
+            prof.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if prof is not None:
+                prof.disable()
+            secs = time.perf_counter() - t0
+            r1, w1 = _io_counters()
+            self._frames().pop()
+            rec = {
+                'timestamp': datetime.utcnow().isoformat()+'Z', 'pid': os.getpid(), 'stage': name,
+                'seconds': round(secs, 6), 'rows': frame['rows'],
+                'bytes_read': r1 - r0 if r0 is not None else None,
+                'bytes_written': w1 - w0 if w0 is not None else None,
+                'peak_rss_bytes': _peak_rss(),
+            }
+            if prof is not None:
+                out = self.profile_dir / f"{name}.{len([r for r in self.records if r['stage'] == name])}.pstats"
+                prof.dump_stats(str(out))
+                rec['profile'] = str(out)
+                with self._lock:
+                    self._profiling = False
+            with self._lock:
+                self.records.append(rec)
+                if self.path is not None:
+                    with self.path.open('a', encoding='utf-8') as f:
+                        f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+
+    def add_rows(self, n: int) -> None:
+        frames = self._frames()
+        if frames:
+            frames[-1]['rows'] = (frames[-1]['rows'] or 0) + int(n)
+
+
+def configure(path: Path | None = None, profile_dir: Path | None = None) -> None:
+    global _recorder
+    _recorder = Recorder(path, profile_dir) if (path is not None or profile_dir is not None) else None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def profiling() -> bool:
+    return _recorder is not None and _recorder.profile_dir is not None
+
+
+def stage(name: str):
+    # Decorador: mede a função como um estágio quando a instrumentação está ligada
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return fn(*args, **kwargs)
+            return _recorder.run(name, fn, args, kwargs)
+        return wrapper
+    return deco
+
+
+def add_rows(n: int) -> None:
+    if _recorder is not None:
+        _recorder.add_rows(n)
+
+
+def prometheus_text(records: list[dict]) -> str:
+    # Formato texto do Prometheus, agregado por estágio (somas; pico = máximo)
+    agg = {}
+    for r in records:
+        a = agg.setdefault(r['stage'], {'runs': 0, 'seconds': 0.0, 'rows': 0, 'read': 0, 'written': 0, 'peak': 0})
+        a['runs'] += 1
+        a['seconds'] += r['seconds']
+        a['rows'] += r['rows'] or 0
+        a['read'] += r['bytes_read'] or 0
+        a['written'] += r['bytes_written'] or 0
+        a['peak'] = max(a['peak'], r['peak_rss_bytes'] or 0)
+    metrics = [
+        ('ong_stage_runs_total', 'counter', 'Execuções do estágio', 'runs'),
+        ('ong_stage_duration_seconds_total', 'counter', 'Tempo total no estágio', 'seconds'),
+        ('ong_stage_rows_total', 'counter', 'Linhas processadas pelo estágio', 'rows'),
+        ('ong_stage_read_bytes_total', 'counter', 'Bytes lidos durante o estágio', 'read'),
+        ('ong_stage_written_bytes_total', 'counter', 'Bytes escritos durante o estágio', 'written'),
+        ('ong_stage_peak_rss_bytes', 'gauge', 'Pico de memória residente do processo ao fim do estágio', 'peak'),
+    ]
+    lines = []
+    for name, kind, help_text, key in metrics:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for st, a in sorted(agg.items()):
+            lines.append(f'{name}{{stage="{st}"}} {a[key]:g}' if isinstance(a[key], float) else f'{name}{{stage="{st}"}} {a[key]}')
+    return '\n'.join(lines) + '\n'
+
+
+def finish() -> Path | None:
+    # Grava o .prom da execução ao lado do JSON-lines (metrics.jsonl -> metrics.prom)
+    if _recorder is None or _recorder.path is None:
+        return None
+    out = _recorder.path.with_suffix('.prom')
+    out.write_text(prometheus_text(_recorder.records), encoding='utf-8')
+    return out
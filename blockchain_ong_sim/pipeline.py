@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from .columnar import file_sha256
+
+
+@dataclass
+class Stage:
+    # fn recebe os resultados das dependências (na ordem de deps) + params e devolve
+    # um Path, uma tupla de Paths ou None. fingerprint, se dado, substitui o hash do
+    # conteúdo das saídas para os estágios seguintes (ex.: hash da ponta da cadeia).
+    name: str
+    fn: Callable
+    deps: tuple[str, ...] = ()
+    params: dict = field(default_factory=dict)
+    cache: bool = True
+    fingerprint: Callable | None = None
+
+
+def _as_paths(result) -> list:
+    if result is None:
+        return []
+    if isinstance(result, (tuple, list)):
+        return list(result)
+    return [result]
+
+
+class StageCache:
+    # Chave de cada estágio = sha256(nome, params, impressões das entradas). O hash de cada
+    # arquivo é memorizado por (tamanho, mtime) para não reler entradas inalteradas.
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = {'files': {}, 'stages': {}}
+        if path.exists():
+            try:
+                self.data = json.loads(path.read_text(encoding='utf-8'))
+            except ValueError:
+                pass
+
+    def save(self) -> None:
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _stamp(p: Path) -> list:
+        st = p.stat()
+        return [st.st_size, st.st_mtime_ns]
+
+    def file_digest(self, p) -> str:
+        if p is None:
+            return 'none'
+        p = Path(p)
+        if not p.exists():
+            return 'missing'
+        key = str(p.resolve())
+        stamp = self._stamp(p)
+        memo = self.data['files'].get(key)
+        if memo and memo[0] == stamp:
+            return memo[1]
+        h = file_sha256(p)
+        self.data['files'][key] = [stamp, h]
+        return h
+
+    def lookup(self, key: str) -> list | None:
+        ent = self.data['stages'].get(key)
+        if not ent:
+            return None
+        # Hit só se as saídas ainda existem exatamente como foram gravadas
+        for p, stamp in zip(ent['outputs'], ent['stamps']):
+            if p is not None and (not Path(p).exists() or self._stamp(Path(p)) != stamp):
+                return None
+        return [Path(p) if p is not None else None for p in ent['outputs']]
+
+    def store(self, key: str, name: str, outputs: list) -> None:
+        self.data['stages'][key] = {
+            'stage': name,
+            'outputs': [str(p) if p is not None else None for p in outputs],
+            'stamps': [self._stamp(Path(p)) if p is not None else None for p in outputs],
+        }
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+def run_dag(stages: list[Stage], cache: StageCache | None, progress: Callable | None = None,
+            cancel=None) -> tuple[dict, list[str]]:
+    # Executa os estágios em ordem (já topológica); com cache, pula os de chave conhecida.
+    # progress(evento, estágio, i, total) com evento 'start' | 'done' | 'cached'; cancel é
+    # um threading.Event consultado entre estágios (o estágio em curso termina).
+    results, prints, skipped = {}, {}, []
+    try:
+        _run_stages(stages, cache, progress, cancel, results, prints, skipped)
+    finally:
+        if cache is not None:
+            cache.save()
+    return results, skipped
+
+
+def _run_stages(stages, cache, progress, cancel, results, prints, skipped) -> None:
+    total = len(stages)
+    for n, st in enumerate(stages):
+        if cancel is not None and cancel.is_set():
+            raise PipelineCancelled(st.name)
+        if progress is not None:
+            progress('start', st.name, n, total)
+        args = [results[d] for d in st.deps]
+        key = None
+        if cache is not None and st.cache:
+            h = hashlib.sha256(json.dumps([st.name, st.params, [prints[d] for d in st.deps]],
+                                          sort_keys=True, default=str).encode('utf-8'))
+            key = h.hexdigest()
+            hit = cache.lookup(key)
+            if hit is not None:
+                results[st.name] = (hit[0] if len(hit) == 1 else tuple(hit)) if hit else None
+                skipped.append(st.name)
+        cached = st.name in results
+        if not cached:
+            results[st.name] = st.fn(*args, **st.params)
+            if key is not None:
+                cache.store(key, st.name, _as_paths(results[st.name]))
+        if st.fingerprint is not None:
+            prints[st.name] = st.fingerprint(results[st.name])
+        elif cache is not None:
+            prints[st.name] = [cache.file_digest(p) for p in _as_paths(results[st.name])]
+        else:
+            prints[st.name] = None
+        if progress is not None:
+            progress('cached' if cached else 'done', st.name, n + 1, total)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+from .chainstore import ChainStore
+from .columnar import read_table
+
+# Modelo do relatório: contagens por status da conciliação e cabeçalhos dos últimos blocos.
+# reconcile e produce_block o atualizam ao gravar seus artefatos; HTML, PDF e GUI só leem
+# este JSON. Cada parte guarda o carimbo (tamanho/mtime) do arquivo de origem e é refeita
+# a partir dele se não bater (ex.: arquivo gerado por versão anterior ou editado à mão).
+STATUSES = ('matched', 'manual_review', 'unmatched')
+LAST_BLOCKS = 10
+
+
+def _stamp(p: Path) -> list:
+    st = p.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load(path: Path) -> dict:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except ValueError:
+            pass
+    return {}
+
+
+def save(path: Path, model: dict) -> None:
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(model, ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def conciliation_part(conc_csv: Path, counts: Counter) -> dict:
+    total = sum(counts.values())
+    out = {s: int(counts.get(s, 0)) for s in STATUSES}
+    return {
+        'file': conc_csv.name, 'stamp': _stamp(conc_csv), 'counts': out, 'total': total,
+        'match_rate': (out['matched'] / total * 100) if total else 0.0,
+    }
+
+
+def chain_part(chain_file: Path | None) -> dict:
+    if not chain_file or not chain_file.exists() or not chain_file.stat().st_size:
+        return {'file': None, 'size': 0, 'blocks': []}
+    blocks = [{k: v for k, v in b.items() if k != 'txs'} for b in ChainStore(chain_file).last(LAST_BLOCKS)]
+    return {'file': chain_file.name, 'size': chain_file.stat().st_size, 'blocks': blocks}
+
+
+def record_conciliation(path: Path, conc_csv: Path, statuses) -> None:
+    # Chamado por reconcile com os status que acabou de gravar (sem reler o CSV)
+    model = load(path)
+    model['conciliation'] = conciliation_part(conc_csv, Counter(statuses))
+    save(path, model)
+
+
+def record_block(path: Path, chain_file: Path, block: dict) -> None:
+    # Chamado por produce_block após o append: empurra o cabeçalho na janela dos últimos blocos
+    model = load(path)
+    part = model.get('chain')
+    if not part or part.get('file') != chain_file.name or \
+            part.get('size') != chain_file.stat().st_size - len(json.dumps(block, ensure_ascii=False).encode('utf-8')) - 1:
+        model['chain'] = chain_part(chain_file)
+    else:
+        header = {k: v for k, v in block.items() if k != 'txs'}
+        part['blocks'] = (part['blocks'] + [header])[-LAST_BLOCKS:]
+        part['size'] = chain_file.stat().st_size
+    save(path, model)
+
+
+def report_model(path: Path, conc_csv: Path | None, chain_file: Path | None, persist: bool = True) -> dict:
+    # Modelo válido para (conc_csv, chain_file); partes desatualizadas são refeitas e salvas.
+    # None = essa parte não interessa ao chamador e não é validada. persist=False: só leitura
+    # (GUI), o arquivo é gravado apenas pelo pipeline.
+    model = load(path)
+    dirty = False
+    part = model.get('conciliation')
+    if conc_csv is not None and (not part or part.get('file') != conc_csv.name or part.get('stamp') != _stamp(conc_csv)):
+        model['conciliation'] = conciliation_part(conc_csv, Counter(read_table(conc_csv)['status'].tolist()))
+        dirty = True
+    part = model.get('chain')
+    size = chain_file.stat().st_size if chain_file is not None and chain_file.exists() else 0
+    if chain_file is not None and (not part or part.get('size') != size or part.get('file') != (chain_file.name if size else None)):
+        model['chain'] = chain_part(chain_file)
+        dirty = True
+    if dirty and persist:
+        save(path, model)
+    return model
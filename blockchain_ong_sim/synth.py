@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Gerador sintético vetorizado (NumPy) de extratos e ledgers em escala (10^6–10^7 linhas).
+# Tudo é derivado de um gerador semeado: mesma semente, mesmos arquivos. Os textos saem de
+# pools pequenos indexados por arrays de inteiros, sem laço Python por linha.
+PREFIXES = np.array(['Doação', 'Pagamento', 'Transferência', 'Repasse', 'Tarifa', 'Compra', 'Reembolso', 'Convênio'], dtype=object)
+SUBJECTS = np.array(['projeto', 'evento', 'fornecedor', 'campanha', 'oficina', 'material', 'serviço', 'aluguel',
+                     'transporte', 'alimentação', 'energia', 'internet', 'manutenção', 'consultoria'], dtype=object)
+COUNTERPARTIES_IN = np.array([f'Doador {c}' for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'], dtype=object)
+COUNTERPARTIES_OUT = np.array([f'Parceiro {c}' for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'], dtype=object)
+# Perturbações de descrição que o banco/ERP costuma introduzir
+SUFFIXES = np.array([' - ref', ' DOC', ' PIX', ' TED', ' (estorno parcial)', ' NF'], dtype=object)
+HEX = np.frombuffer(b'0123456789ABCDEF', dtype=np.uint8)
+
+
+@dataclass
+class NoiseModel:
+    # Probabilidades por linha do ledger em relação ao extrato
+    date_shift: float = 0.05       # data deslocada em ±1..max_shift_days
+    max_shift_days: int = 2
+    fee: float = 0.03              # valor com diferença de tarifa (centavos até fee_max)
+    fee_max: float = 2.50
+    desc: float = 0.30             # sufixo na descrição
+    missing: float = 1 / 7         # linha do extrato ausente no ledger
+    duplicate: float = 0.01        # lançamento duplicado no ledger
+
+
+def _hex_ids(ids: np.ndarray, width: int = 8) -> np.ndarray:
+    # '0x%08X' vetorizado: nibbles -> tabela ASCII -> bytes de largura fixa
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64) * 4
+    nib = (ids.astype(np.uint64)[:, None] >> shifts) & np.uint64(0xF)
+    raw = np.empty((len(ids), width + 2), dtype=np.uint8)
+    raw[:, 0], raw[:, 1] = ord('0'), ord('x')
+    raw[:, 2:] = HEX[nib.astype(np.intp)]
+    return raw.view(f'S{width + 2}').ravel().astype(f'U{width + 2}')
+
+
+def _date_pool(start: str, first: int, last: int) -> np.ndarray:
+    # Datas ISO formatadas uma vez por dia do intervalo; as linhas só indexam o pool
+    return (np.datetime64(start) + np.arange(first, last + 1)).astype('datetime64[D]').astype(str).astype(object)
+
+
+def _desc_pool() -> np.ndarray:
+    return np.array([f'{p} {s} {k}' for p in PREFIXES for s in SUBJECTS for k in range(1, 51)], dtype=object)
+
+
+def synth_extract(n: int, seed: int = 0, start: str = '2024-01-01', span_days: int | None = None,
+                  opening_balance: float = 10000.0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    span = span_days or max(30, n // 200)
+    dates = _date_pool(start, 0, span - 1)[np.sort(rng.integers(0, span, n))]
+    credit = rng.random(n) < 0.45
+    cents = np.round(rng.lognormal(mean=4.5, sigma=1.0, size=n) * 100).astype(np.int64) + 1
+    amount = np.where(credit, cents, -cents) / 100
+    balance = np.round(opening_balance + np.cumsum(np.where(credit, cents, -cents)) / 100, 2)
+    pool = _desc_pool()
+    cp = np.where(credit, COUNTERPARTIES_IN[rng.integers(0, len(COUNTERPARTIES_IN), n)],
+                  COUNTERPARTIES_OUT[rng.integers(0, len(COUNTERPARTIES_OUT), n)])
+    return pd.DataFrame({
+        'date': dates,
+        'description': pool[rng.integers(0, len(pool), n)],
+        'amount': amount,
+        'balance': balance,
+        'category': np.where(credit, 'Doação', 'Pagamento'),
+        'counterparty': cp,
+    })
+
+
+def synth_ledger(ext: pd.DataFrame, noise: NoiseModel | None = None, seed: int = 1) -> pd.DataFrame:
+    # Ledger "contábil" derivado do extrato com ruído configurável
+    noise = noise or NoiseModel()
+    rng = np.random.default_rng(seed)
+    n = len(ext)
+    keep = rng.random(n) >= noise.missing
+    idx = np.flatnonzero(keep)
+    dup = idx[rng.random(len(idx)) < noise.duplicate]
+    idx = np.sort(np.concatenate([idx, dup]), kind='stable')
+    m = len(idx)
+    uniq, day = np.unique(ext['date'].to_numpy()[idx], return_inverse=True)
+    first = np.datetime64(uniq[0], 'D') if len(uniq) else np.datetime64('1970-01-01')
+    day = (uniq.astype('datetime64[D]') - first).astype(np.int64)[day] if len(uniq) else day
+    shift = rng.random(m) < noise.date_shift
+    k = rng.integers(1, noise.max_shift_days + 1, m) * np.where(rng.random(m) < 0.5, -1, 1)
+    day = np.where(shift, day + k, day)
+    s = noise.max_shift_days
+    dates = _date_pool(str(first), -s, int(day.max(initial=0)))[day + s]
+    cents = np.round(ext['amount'].to_numpy()[idx] * 100).astype(np.int64)
+    fee = rng.random(m) < noise.fee
+    delta = rng.integers(1, int(round(noise.fee_max * 100)) + 1, m)
+    # Tarifa reduz o módulo sem trocar o sinal
+    cents = np.where(fee, np.sign(cents) * np.maximum(np.abs(cents) - delta, 1), cents)
+    desc = ext['description'].to_numpy()[idx].astype(object)
+    pert = np.flatnonzero(rng.random(m) < noise.desc)
+    desc[pert] = desc[pert] + SUFFIXES[rng.integers(0, len(SUFFIXES), len(pert))]
+    return pd.DataFrame({
+        'tx_id': _hex_ids(np.arange(1, m + 1)),
+        'date': dates,
+        'amount': cents / 100,
+        'description': desc,
+        'counterparty': ext['counterparty'].to_numpy()[idx],
+    })
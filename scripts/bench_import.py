@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+COMMANDS = ['anchor', 'emit-extract']
+# Não devem aparecer na partida dos comandos leves
+HEAVY = ('pandas', 'numpy', 'PIL', 'reportlab')
+
+
+def parse_importtime(stderr: str) -> tuple[float, list[tuple[str, float, bool]]]:
+    # Linhas "import time: self | cumulative | nome"; nomes sem indentação são importações
+    # de primeiro nível, cuja soma dos cumulativos é o tempo total de importação
+    total, mods = 0.0, []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        top = not name[1:].startswith(' ')
+        mods.append((name.strip(), int(cum) / 1000, top))
+        if top:
+            total += int(cum) / 1000
+    return total, mods
+
+
+def run_cmd(cmd: str, workdir: str) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')])))
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'blockchain_ong_sim.cli', *cmd.split()],
+                       cwd=workdir, env=env, capture_output=True, text=True)
+    wall = (time.perf_counter() - t0) * 1000
+    if p.returncode:
+        raise SystemExit(f'{cmd}: exit {p.returncode}\n{p.stderr[-2000:]}')
+    total, mods = parse_importtime(p.stderr)
+    heavy = sorted({n for n, _, _ in mods if n in HEAVY})
+    slowest = sorted(((n, ms) for n, ms, top in mods if top), key=lambda m: -m[1])[:5]
+    return {'command': cmd, 'import_ms': round(total, 1), 'wall_ms': round(wall, 1), 'heavy': heavy,
+            'slowest': [[n, round(ms, 1)] for n, ms in slowest]}
+
+
+def seed_anchor(workdir: str) -> None:
+    # Uma âncora pendente no diário: anchor sela um bloco de verdade
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from blockchain_ong_sim import cli
+        cli.ensure_dirs()
+        with open(cli.ANCHORS / 'pending.jsonl', 'ab') as f:
+            f.write(cli.tx_bytes_of({'kind': 'bank_extract', 'source_file': 'b.csv', 'canonical_file': 'b.canonical.csv',
+                                     'sha256': '0' * 64, 'timestamp': '2024-01-01T00:00:00Z'}) + b'\n')
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Mede a partida a frio (-X importtime) de comandos leves da CLI')
+    ap.add_argument('--commands', nargs='+', default=COMMANDS)
+    ap.add_argument('--repeat', type=int, default=5, help='execuções por comando (vale a menor)')
+    ap.add_argument('--budget-ms', type=float, default=150.0, help='tempo máximo de importação por comando')
+    ap.add_argument('--output', type=Path, help='grava os resultados em JSON')
+    args = ap.parse_args()
+
+    results, failed = [], []
+    print(f"{'command':<16} {'import_ms':>10} {'wall_ms':>9}  heavy")
+    with tempfile.TemporaryDirectory(prefix='benchimport-') as workdir:
+        # Aquecimento: compila os .pyc, para medir só importação
+        run_cmd('--help', workdir)
+        for cmd in args.commands:
+            runs = []
+            for _ in range(args.repeat):
+                if cmd.split()[0] == 'anchor':
+                    seed_anchor(workdir)
+                runs.append(run_cmd(cmd, workdir))
+            r = min(runs, key=lambda x: x['import_ms'])
+            r['wall_ms'] = min(x['wall_ms'] for x in runs)
+            r['budget_ms'] = args.budget_ms
+            results.append(r)
+            over = r['import_ms'] > args.budget_ms or r['heavy']
+            if over:
+                failed.append(r)
+            print(f"{cmd:<16} {r['import_ms']:>10.1f} {r['wall_ms']:>9.1f}  {','.join(r['heavy']) or '-'}"
+                  f"{'  OVER BUDGET' if over else ''}", flush=True)
+            if over:
+                for n, ms in r['slowest']:
+                    print(f"    {n:<40} {ms:>8.1f} ms")
+    if args.output:
+        args.output.write_text(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=1), encoding='utf-8')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
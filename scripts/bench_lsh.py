@@ -0,0 +1,73 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from blockchain_ong_sim.lsh import MinHashLSH  # noqa: E402
+from blockchain_ong_sim.matching import jaccard, tokenize_all  # noqa: E402
+
+
+def synth_corpus(n: int, queries: int, seed: int = 11):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f'w{i}' for i in range(5000)])
+    docs = [' '.join(rng.choice(vocab, rng.integers(4, 9), replace=False)) for _ in range(n)]
+    qs = []
+    for j in rng.integers(0, n, queries):
+        toks = docs[j].split()
+        # Perturbação: troca um token e às vezes acrescenta outro (tarifa, referência...)
+        toks[rng.integers(0, len(toks))] = str(rng.choice(vocab))
+        if rng.random() < 0.5:
+            toks.append('tarifa')
+        qs.append(' '.join(toks))
+    return docs, qs
+
+
+def exact_topk(q_sets, d_sets, min_sim, top_k):
+    out = []
+    for q in q_sets:
+        scored = [(j, jaccard(q, d)) for j, d in enumerate(d_sets)]
+        scored = [c for c in scored if c[1] >= min_sim]
+        scored.sort(key=lambda c: (-c[1], c[0]))
+        out.append(scored[:top_k])
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Compara o índice MinHash/LSH com Jaccard exato (força bruta)')
+    ap.add_argument('--ledger', type=int, default=50000)
+    ap.add_argument('--queries', type=int, default=300)
+    ap.add_argument('--min-sim', type=float, default=0.5)
+    ap.add_argument('--top-k', type=int, default=3)
+    ap.add_argument('--configs', nargs='+', default=['8x4', '16x4', '32x4', '16x2', '20x5'],
+                    help='bandas x linhas por banda')
+    args = ap.parse_args()
+    docs, qs = synth_corpus(args.ledger, args.queries)
+    d_sets, q_sets = tokenize_all(docs), tokenize_all(qs)
+    t0 = time.perf_counter()
+    truth = exact_topk(q_sets, d_sets, args.min_sim, args.top_k)
+    t_exact = time.perf_counter() - t0
+    relevant = sum(len(t) for t in truth)
+    print(f'ledger={args.ledger} queries={args.queries} exact={t_exact:.3f}s ({relevant} pares >= {args.min_sim})')
+    print(f"{'config':>7} {'thresh':>7} {'build_s':>8} {'query_s':>8} {'speedup':>8} {'cand/q':>8} {'recall':>7}")
+    for cfg in args.configs:
+        b, r = (int(x) for x in cfg.split('x'))
+        idx = MinHashLSH(bands=b, rows=r)
+        t0 = time.perf_counter()
+        idx.add(d_sets)
+        t_build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        got = idx.query(q_sets, min_sim=args.min_sim, top_k=args.top_k)
+        t_query = time.perf_counter() - t0
+        cand = np.mean([len(c) for c in idx.candidates(q_sets)])
+        hit = sum(len(set(g) & set(t)) for g, t in zip(got, truth))
+        recall = hit / relevant if relevant else 1.0
+        print(f'{cfg:>7} {idx.threshold:>7.2f} {t_build:>8.3f} {t_query:>8.3f} {t_exact / t_query:>7.1f}x {cand:>8.1f} {recall:>7.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+STAGES = ['synth', 'canonicalize', 'reconcile', 'merkle_root', 'produce_block', 'render_dashboards']
+BASELINE = ROOT / 'scripts' / 'bench_baseline.json'
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # Windows: sem resource; psutil se estiver instalado
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 1024
+
+
+def run_stage(job):
+    # Executado num processo novo (spawn) por medição: o pico de RSS é só deste estágio.
+    # A preparação (entradas do estágio) fica fora do cronômetro.
+    stage, n, seed, workdir = job
+    os.chdir(workdir)
+    # Os estágios imprimem os caminhos gerados; aqui só interessa a tabela
+    sys.stdout = open(os.devnull, 'w')
+    from blockchain_ong_sim import cli
+    from blockchain_ong_sim.canonical import write_canonical
+    from blockchain_ong_sim.mempool import BlockPolicy
+    from blockchain_ong_sim.synth import synth_extract, synth_ledger
+    cli.ensure_dirs()
+    src = cli.INBOX / f'extrato_bench_{n}.csv'
+    canon = cli.PROCESSED / f'extrato_bench_{n}.canonical.csv'
+    ledger = cli.LEDGER / f'extrato_bench_{n}.canonical.ledger.csv'
+    conc = cli.CONCIL / f'extrato_bench_{n}.canonical.conciliation.csv'
+    if stage != 'synth' and not src.exists():
+        synth_extract(n, seed).to_csv(src, index=False)
+    if stage in ('reconcile', 'render_dashboards', 'merkle_root') and not canon.exists():
+        write_canonical(src, canon)
+    if stage in ('reconcile', 'render_dashboards') and not ledger.exists():
+        synth_ledger(synth_extract(n, seed), seed=seed + 1).to_csv(ledger, index=False)
+    if stage == 'render_dashboards' and not conc.exists():
+        cli.reconcile(canon, ledger)
+    if stage == 'merkle_root':
+        with open(canon, 'rb') as f:
+            leaves = f.read().splitlines()[1:]
+    if stage == 'produce_block':
+        # n âncoras no diário, sem fronteira: mede o caminho completo (árvore inteira)
+        (cli.ANCHORS / 'pending.frontier.json').unlink(missing_ok=True)
+        with open(cli.ANCHORS / 'pending.jsonl', 'wb') as f:
+            for i in range(n):
+                f.write(cli.tx_bytes_of({'kind': 'bank_extract', 'source_file': f'b{i}.csv',
+                                         'canonical_file': f'b{i}.canonical.csv', 'sha256': f'{i:064x}',
+                                         'timestamp': '2024-01-01T00:00:00Z'}) + b'\n')
+
+    t0 = time.perf_counter()
+    if stage == 'synth':
+        ext = synth_extract(n, seed)
+        synth_ledger(ext, seed=seed + 1)
+    elif stage == 'canonicalize':
+        cli.canonicalize(src)
+    elif stage == 'reconcile':
+        cli.reconcile(canon, ledger)
+    elif stage == 'merkle_root':
+        cli.merkle_root(leaves)
+    elif stage == 'produce_block':
+        cli.produce_block(BlockPolicy(max_txs=n, max_bytes=1 << 62))
+    elif stage == 'render_dashboards':
+        cli.render_dashboards(canon, conc)
+    secs = time.perf_counter() - t0
+    peak = peak_rss_mb()
+    return {'stage': stage, 'rows': n, 'seconds': round(secs, 4),
+            'rows_per_s': round(n / secs, 1) if secs > 0 else None,
+            'peak_rss_mb': round(peak, 1) if peak is not None else None}
+
+
+def compare(results, baseline, tolerance):
+    # Razão de tempo contra o baseline do mesmo estágio/tamanho; > 1 + tolerance = regressão
+    base = {(b['stage'], b['rows']): b for b in baseline.get('results', [])}
+    regressions = []
+    for r in results:
+        b = base.get((r['stage'], r['rows']))
+        r['vs_baseline'] = round(r['seconds'] / b['seconds'], 2) if b and b['seconds'] else None
+        if r['vs_baseline'] is not None and r['vs_baseline'] > 1 + tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Mede tempo, pico de RSS e linhas/s de cada estágio em vários tamanhos')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    ap.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    ap.add_argument('--seed', type=int, default=42)
+    ap.add_argument('--max-render-rows', type=int, default=5_000, help='render_dashboards só até este tamanho (uma página por ~20 linhas)')
+    ap.add_argument('--baseline', type=Path, default=BASELINE, help='JSON de referência para comparação')
+    ap.add_argument('--save-baseline', action='store_true', help='grava esta execução como baseline')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='folga de tempo antes de acusar regressão (0.25 = +25%%)')
+    ap.add_argument('--output', type=Path, help='grava os resultados em JSON')
+    args = ap.parse_args()
+
+    results = []
+    ctx = get_context('spawn')
+    print(f"{'stage':<18} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'peak_MB':>8}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory(prefix=f'bench{n}-') as workdir:
+            for stage in args.stages:
+                if stage == 'render_dashboards' and n > args.max_render_rows:
+                    continue
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    r = pool.submit(run_stage, (stage, n, args.seed, workdir)).result()
+                results.append(r)
+                print(f"{r['stage']:<18} {r['rows']:>10} {r['seconds']:>9.3f} {r['rows_per_s'] or 0:>12.0f} {r['peak_rss_mb'] or 0:>8.1f}", flush=True)
+
+    regressions = []
+    if args.baseline.exists() and not args.save_baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+        print()
+        print(f"{'stage':<18} {'rows':>10} {'x baseline':>11}")
+        for r in results:
+            flag = '  REGRESSION' if r in regressions else ''
+            print(f"{r['stage']:<18} {r['rows']:>10} {r['vs_baseline'] if r['vs_baseline'] is not None else '-':>11}{flag}")
+    doc = {'python': sys.version.split()[0], 'platform': sys.platform, 'cpus': os.cpu_count(),
+           'seed': args.seed, 'results': results}
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(doc, indent=1), encoding='utf-8')
+        print('baseline:', args.baseline)
+    if args.output:
+        args.output.write_text(json.dumps(doc, indent=1), encoding='utf-8')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from blockchain_ong_sim.matching import jaccard, match_frames, token_set  # noqa: E402
+
+
+def legacy_reconcile_rows(ext, led, date_window_days=1, desc_thresh=0.4):
+    # Laço aninhado original (iterrows x iterrows), mantido aqui só como referência
+    import datetime as dt
+    conc = []
+    for _, er in ext.iterrows():
+        e_date = dt.date.fromisoformat(str(er['date']))
+        e_amt = float(er['amount'])
+        e_desc = str(er['description'])
+        e_cp = str(er['counterparty'])
+        candidates = []
+        for _, lr in led.iterrows():
+            l_date = dt.date.fromisoformat(str(lr['date']))
+            l_amt = float(lr['amount'])
+            if abs((l_date - e_date).days) <= date_window_days and abs(l_amt - e_amt) < 1e-6:
+                d_sim = jaccard(token_set(e_desc), token_set(lr['description']))
+                candidates.append((d_sim, lr))
+        if candidates:
+            candidates.sort(key=lambda x: x[0], reverse=True)
+            d_sim, lr = candidates[0]
+            score = 0.5*1.0 + 0.3*1.0 + 0.2*float(d_sim)
+            status = 'matched' if score >= 0.85 and d_sim >= desc_thresh else ('manual_review' if score >= 0.6 else 'unmatched')
+            conc.append({
+                'tx_id_ledger': lr['tx_id'], 'date': er['date'], 'amount': e_amt,
+                'counterparty': e_cp, 'match_score': round(score, 2), 'status': status,
+            })
+        else:
+            conc.append({
+                'tx_id_ledger': '', 'date': er['date'], 'amount': e_amt,
+                'counterparty': e_cp, 'match_score': 0.0, 'status': 'unmatched',
+            })
+    return conc
+
+
+def synth(n: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, max(30, n // 50), n))
+    dates = (np.datetime64('2024-01-01') + days).astype(str)
+    # Poucos valores distintos para gerar vários candidatos por linha
+    amounts = np.round(rng.choice(np.arange(100, 100 + max(50, n // 20)) * 1.25, n), 2)
+    ext = pd.DataFrame({
+        'date': dates,
+        'description': [f'Movimento {i % 97}' for i in range(n)],
+        'amount': amounts,
+        'counterparty': np.where(amounts > 0, 'Doador Y', 'Parceiro X'),
+    })
+    keep = np.arange(1, n + 1) % 7 != 0
+    led = pd.DataFrame({
+        'tx_id': [f'0x{i:04X}{i:04X}' for i in range(1, n + 1)],
+        'date': ext['date'],
+        'amount': ext['amount'],
+        'description': [d + (' - ref' if i % 3 == 0 else '') for i, d in enumerate(ext['description'], start=1)],
+        'counterparty': ext['counterparty'],
+    })[keep].reset_index(drop=True)
+    return ext, led
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Compara o laço original de reconcile com o motor indexado')
+    ap.add_argument('--sizes', type=int, nargs='+', default=[200, 1000, 2000, 100000])
+    ap.add_argument('--legacy-max', type=int, default=2000, help='maior tamanho em que o laço original é executado')
+    args = ap.parse_args()
+    print(f"{'rows':>8} {'legacy_s':>10} {'indexed_s':>10} {'speedup':>9} same")
+    for n in args.sizes:
+        ext, led = synth(n)
+        t0 = time.perf_counter()
+        new = match_frames(ext, led)
+        t_new = time.perf_counter() - t0
+        if n <= args.legacy_max:
+            t0 = time.perf_counter()
+            old = legacy_reconcile_rows(ext, led)
+            t_old = time.perf_counter() - t0
+            print(f'{n:>8} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>8.1f}x {old == new}')
+        else:
+            print(f'{n:>8} {"-":>10} {t_new:>10.3f} {"-":>9} -')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from blockchain_ong_sim.canonical import normalize_extract, read_extract, write_canonical  # noqa: E402
+
+
+def mixed_extract(n: int, seed: int = 3) -> pd.DataFrame:
+    # Colunas que a inferência por bloco trataria diferente: descrição numérica com vazios,
+    # ids com zeros à esquerda, valores ausentes, datas com e sem hora, aspas e vírgulas
+    rng = np.random.default_rng(seed)
+    desc = rng.integers(0, 9, n).astype(str).astype(object)
+    desc[rng.random(n) < 0.2] = ''
+    desc[rng.random(n) < 0.05] = 'texto, "com aspas"'
+    amount = np.round(rng.normal(0, 500, n), 2).astype(object)
+    amount[rng.random(n) < 0.02] = ''
+    dates = (np.datetime64('2024-01-01') + rng.integers(0, 60, n)).astype(str).astype(object)
+    timed = rng.random(n) < 0.1
+    dates[timed] = dates[timed] + ' 10:30:00'
+    return pd.DataFrame({
+        'date': dates,
+        'description': desc,
+        'amount': amount,
+        'balance': np.round(rng.normal(1e4, 1e3, n), 2),
+        'category': np.where(rng.random(n) < 0.5, 'Doação', ''),
+        'counterparty': rng.choice(['Doador Y', 'Parceiro X', ''], n),
+        'doc_id': [f'{i:06d}' if i % 11 else '' for i in range(n)],
+    })
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Confere que o canônico em blocos é byte a byte igual ao caminho direto')
+    ap.add_argument('--rows', type=int, default=2000)
+    ap.add_argument('--chunks', type=int, nargs='+', default=[7, 100, 333, 1000])
+    args = ap.parse_args()
+    failed = False
+    with tempfile.TemporaryDirectory(prefix='checkcanon-') as tmp:
+        src = Path(tmp) / 'extrato_mixed.csv'
+        mixed_extract(args.rows).to_csv(src, index=False)
+        ref = Path(tmp) / 'ref.csv'
+        normalize_extract(read_extract(src)).to_csv(ref, index=False)
+        want = ref.read_bytes()
+        print(f"{'chunk_rows':>10} {'runs':>5} same")
+        for c in args.chunks:
+            out = Path(tmp) / f'c{c}.csv'
+            _h, _rows, runs = write_canonical(src, out, c)
+            same = out.read_bytes() == want
+            failed |= not same
+            print(f'{c:>10} {runs:>5} {same}')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()